@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Set, Type
+
+from django.db import connections, transaction
+from django.db.models import Model
+
+logger = logging.getLogger(__name__)
+
+
+class BulkWriter:
+    """Batches model writes into a single transaction.
+
+    Every write runs on a thread owned by the writer, so all of them share one
+    database connection and the transaction opened in `__aenter__`. Leaving
+    the context commits, or rolls everything back when an exception escapes.
+
+    Batches execute one at a time on that connection; `max_pending` bounds
+    how many may be queued behind it so producers wait instead of buffering a
+    whole library. The batch size adapts towards `target_duration` seconds
+    per batch.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        min_batch_size: int = 10,
+        max_batch_size: int = 2000,
+        max_pending: int = 4,
+        target_duration: float = 0.25,
+    ):
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_duration = target_duration
+        self.rows = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self._atomic: Optional[transaction.Atomic] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="BulkWriter"
+        )
+        self._pending: Set[asyncio.Future] = set()
+        self._slots = asyncio.Semaphore(max_pending)
+
+    async def __aenter__(self) -> "BulkWriter":
+        self._atomic = transaction.atomic()
+        await self.run(self._atomic.__enter__)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc is None:
+                await self.flush()
+            else:
+                await self.cancel()
+        except Exception as e:
+            exc_type, exc, tb = type(e), e, e.__traceback__
+            raise
+        finally:
+            await self.run(self._atomic.__exit__, exc_type, exc, tb)
+            await self.run(connections.close_all)
+            self._executor.shutdown(wait=False)
+            logger.info(
+                "bulk writer %s %d rows in %0.3fs (%0.1f rows/s)",
+                "committed" if exc is None else "rolled back",
+                self.rows,
+                self.seconds,
+                self.rows_per_second,
+            )
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "rows": self.rows,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "batch_size": self.batch_size,
+        }
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Runs fn on the writer's connection, inside its transaction."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def write(self, model: Type[Model], objs: List[Model], **kwargs) -> None:
+        """Queues objs for bulk_create, waiting while max_pending batches are queued.
+
+        kwargs are passed through to bulk_create.
+        """
+        start = 0
+        while start < len(objs):
+            batch = objs[start : start + self.batch_size]
+            start += len(batch)
+            await self._slots.acquire()
+            task = asyncio.ensure_future(self._write(model, batch, kwargs))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def flush(self) -> None:
+        """Waits for every queued batch, raising the first failure."""
+        while self._pending:
+            await asyncio.gather(*self._pending)
+
+    async def cancel(self) -> None:
+        for task in self._pending:
+            task.cancel()
+        await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def _write(self, model: Type[Model], batch: List[Model], kwargs: dict):
+        try:
+            started = time.perf_counter()
+            await self.run(model.objects.bulk_create, batch, **kwargs)
+            duration = time.perf_counter() - started
+            self.rows += len(batch)
+            self.batches += 1
+            self.seconds += duration
+            self._adapt(len(batch), duration)
+        finally:
+            self._slots.release()
+
+    def _adapt(self, rows: int, duration: float) -> None:
+        # a short tail batch says nothing about how large a batch could be
+        if rows < self.batch_size:
+            return
+        if duration < self.target_duration / 2:
+            self.batch_size = min(self.batch_size * 2, self.max_batch_size)
+        elif duration > self.target_duration:
+            self.batch_size = max(self.batch_size // 2, self.min_batch_size)
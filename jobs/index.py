@@ -0,0 +1,72 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterator, Optional
+
+
+class ArticleIndex:
+    """Sorted article ids with a 64 bit prefix of each content hash.
+
+    Two flat arrays take 16 bytes per article, a fraction of a dict of
+    ints to hex strings, and lookups are a binary search. A byte per article
+    records which ids a sync has seen, so the unseen ones can be deleted.
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.digests = array("Q")
+        self.seen = bytearray()
+
+    @staticmethod
+    def digest(content_hash: str) -> int:
+        return int(content_hash[:16] or "0", 16)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids)
+
+    def __contains__(self, article_id: int) -> bool:
+        return self._find(article_id) is not None
+
+    def _find(self, article_id: int) -> Optional[int]:
+        i = bisect_left(self.ids, article_id)
+        if i < len(self.ids) and self.ids[i] == article_id:
+            return i
+        return None
+
+    def get(self, article_id: int) -> Optional[int]:
+        i = self._find(article_id)
+        return None if i is None else self.digests[i]
+
+    def append(self, article_id: int, content_hash: str) -> None:
+        """Adds an id larger than every id already in the index."""
+        if self.ids and article_id <= self.ids[-1]:
+            raise ValueError(f"{article_id} is out of order")
+        self.ids.append(article_id)
+        self.digests.append(self.digest(content_hash))
+        self.seen.append(0)
+
+    def add(self, article_id: int, content_hash: str) -> None:
+        i = bisect_left(self.ids, article_id)
+        if i < len(self.ids) and self.ids[i] == article_id:
+            self.digests[i] = self.digest(content_hash)
+            return
+        self.ids.insert(i, article_id)
+        self.digests.insert(i, self.digest(content_hash))
+        self.seen.insert(i, 0)
+
+    def matches(self, article_id: int, content_hash: str) -> Optional[bool]:
+        """None when the article is unknown, else whether its hash is unchanged."""
+        current = self.get(article_id)
+        if current is None:
+            return None
+        return current == self.digest(content_hash)
+
+    def mark(self, article_id: int) -> None:
+        i = self._find(article_id)
+        if i is not None:
+            self.seen[i] = 1
+
+    def unseen(self) -> Iterator[int]:
+        return (i for i, seen in zip(self.ids, self.seen) if not seen)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from http import HTTPStatus
+from typing import Dict, List, Optional
+
+import aiohttp
+import feedparser
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+
+from jobs.metrics import Metrics, metrics as default_metrics
+from news.models import Feed, FeedRegistry  # noqa
+from scrutiny.env import (  # noqa
+    get_feed_poller_concurrency,
+    get_feed_poller_max_interval,
+    get_feed_poller_min_interval,
+    get_metrics_log_interval,
+)
+from .news_summary import HttpRequest, join_titles, titles_key
+
+logger = logging.getLogger(__name__)
+
+FETCH_TIMEOUT = 30.0
+
+
+class FeedState:
+    """What the poller knows of a feed between two of its polls."""
+
+    def __init__(self, feed: Feed, interval: float):
+        self.feed = feed
+        self.interval = interval
+        self.etag: Optional[str] = None
+        self.modified: Optional[str] = None
+        self.key: Optional[str] = None
+        self.polls = 0
+        self.changes = 0
+
+    @property
+    def change_rate(self) -> float:
+        return self.changes / self.polls if self.polls else 0.0
+
+
+class FeedPoller:
+    """Polls feeds concurrently, each at an interval following its changes.
+
+    Every feed is a coroutine sleeping between its polls, and at most
+    `concurrency` of them fetch at a time, so hundreds of feeds share one
+    connection pool. The interval of a feed halves when it changed since its
+    last poll and grows by half when it did not, within the interval bounds.
+    Fetches are conditional, an unchanged feed answers 304 and is not parsed.
+    """
+
+    def __init__(
+        self,
+        req: HttpRequest,
+        concurrency: int = 8,
+        min_interval: float = 60.0,
+        max_interval: float = 60 * 60.0,
+        metrics: Metrics = default_metrics,
+    ):
+        self.req = req
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.metrics = metrics
+        self.slots = asyncio.Semaphore(concurrency)
+
+    async def fetch(self, state: FeedState) -> bool:
+        """Fetches a feed, returning whether its titles changed since the last fetch."""
+        headers = {}
+        if state.etag:
+            headers["If-None-Match"] = state.etag
+        if state.modified:
+            headers["If-Modified-Since"] = state.modified
+        started = time.monotonic()
+        async with self.req.session.get(str(state.feed.url), headers=headers) as resp:
+            body = None if resp.status == HTTPStatus.NOT_MODIFIED else await resp.read()
+            state.etag = resp.headers.get("ETag", state.etag)
+            state.modified = resp.headers.get("Last-Modified", state.modified)
+        self.metrics.observe(
+            f"feed_poller.fetch_latency.{state.feed.id}", time.monotonic() - started
+        )
+        if body is None:
+            self.metrics.incr("feed_poller.not_modified")
+            return False
+        parsed = await sync_to_async(feedparser.parse, thread_sensitive=False)(body)
+        key = titles_key(join_titles(parsed.entries))
+        changed = state.key is not None and key != state.key
+        state.key = key
+        return changed
+
+    async def poll_once(self, state: FeedState) -> None:
+        async with self.slots:
+            try:
+                changed = await self.fetch(state)
+            except Exception as e:
+                # failures back off like unchanged polls
+                logger.warning("unable to poll feed %s: %r", state.feed.id, e)
+                self.metrics.incr("feed_poller.errors")
+                changed = False
+            else:
+                state.polls += 1
+                state.changes += changed
+        factor = 0.5 if changed else 1.5
+        state.interval = min(
+            max(state.interval * factor, self.min_interval), self.max_interval
+        )
+        self.metrics.gauge(
+            f"feed_poller.change_rate.{state.feed.id}", state.change_rate
+        )
+        self.metrics.gauge(f"feed_poller.interval.{state.feed.id}", state.interval)
+
+    async def poll_feed(self, state: FeedState) -> None:
+        while True:
+            await self.poll_once(state)
+            await asyncio.sleep(state.interval)
+
+    async def run(self, feeds: List[Feed], once: bool = False) -> Dict[str, FeedState]:
+        states = {feed.id: FeedState(feed, self.min_interval) for feed in feeds}
+        poll = self.poll_once if once else self.poll_feed
+        await asyncio.gather(*(poll(state) for state in states.values()))
+        return states
+
+
+def feed_session(limit: int = 8) -> aiohttp.ClientSession:
+    return aiohttp.ClientSession(
+        raise_for_status=True,
+        connector=aiohttp.TCPConnector(limit=limit),
+        timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT),
+    )
+
+
+async def main(concurrency: int, once: bool = False) -> None:
+    reporter = asyncio.ensure_future(default_metrics.report(get_metrics_log_interval()))
+    try:
+        async with feed_session(concurrency) as session:
+            poller = FeedPoller(
+                HttpRequest(session=session),
+                concurrency=concurrency,
+                min_interval=get_feed_poller_min_interval(),
+                max_interval=get_feed_poller_max_interval(),
+            )
+            await poller.run(FeedRegistry.feeds(), once=once)
+    finally:
+        reporter.cancel()
+
+
+class Command(BaseCommand):
+    help = "Poll every registered feed at an interval adapted to its changes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            help="Feeds fetched at the same time",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Poll every feed once and exit",
+        )
+
+    def handle(self, *args, **options) -> None:
+        asyncio.run(
+            main(
+                options.get("concurrency") or get_feed_poller_concurrency(),
+                once=options.get("once", False),
+            )
+        )
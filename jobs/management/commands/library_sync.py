@@ -1,214 +1,647 @@
 import asyncio
+import contextlib
+import hashlib
+import json
 import logging
 import time
-from asyncio.tasks import Task
-from typing import Any, List
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Set, Tuple
 
 import aiohttp
-from django.contrib.auth.models import User
+
 from django.core.management.base import BaseCommand
-from pydantic import BaseModel
-from pydantic.dataclasses import dataclass
+from django.db import connection
+from django.utils import timezone
+from psycopg.types.json import Jsonb
 from social_django.models import UserSocialAuth
 
 from library.models import Article, Tag
-from scrutiny.env import get_pocket_consumer_key
-
+from scrutiny.env import (
+    get_bulk_batch_size,
+    get_bulk_max_pending,
+    get_library_sync_pool_size,
+    get_pocket_concurrency,
+    get_pocket_connection_limit,
+    get_pocket_consumer_key,
+    get_pocket_full_sync_interval,
+    get_pocket_max_retries,
+    get_pocket_page_size,
+    get_pocket_rate_burst,
+    get_pocket_rate_limit,
+    get_pocket_retry_budget,
+)
+
+from jobs.bulk import BulkWriter
+from jobs.index import ArticleIndex
+from jobs.metrics import metrics
 from jobs.models import Job
+from jobs.pocket import PocketClient, RetryBudget
+from jobs.stream import iter_object
 
 
-@dataclass
-class HttpRequest:
-    session: Any
-    base_url: str = "https://getpocket.com"
-    read_timeout: float = 10.0
-    header = {"Content-Type": "application/json"}
+class Item(NamedTuple):
+    """A pocket item as it comes off the wire, before any model is built."""
 
+    id: int
+    authors: Any
+    excerpt: Optional[str]
+    resolved_title: Optional[str]
+    listen_duration_estimate: Optional[int]
+    content_hash: str
+    tags: Tuple[str, ...]
 
+
+# plain dataclasses, a page is built for every response and its items are
+# already well formed, validating them again would cost more than decoding
 @dataclass
-class Response:
-    data: dict
-    success: bool = False
+class Page:
+    items: List[Item] = field(default_factory=list)
+    removed: List[int] = field(default_factory=list)
+    count: int = 0
+    since: Optional[int] = None
 
 
-class ArticleModel(BaseModel):
-    class Config:
-        arbitrary_types_allowed = True
+@dataclass
+class Diff:
+    insert: List[Item] = field(default_factory=list)
+    update: List[Item] = field(default_factory=list)
+    unchanged: int = 0
 
-    article: Article
-    tags: List[Tag]
+    @property
+    def changed(self) -> List[Item]:
+        return self.insert + self.update
 
 
 READ_TIMEOUT = 10.0
-ERROR_RESPONSE = Response(data=dict(), success=False)
+# pocket item status values, 1 is archived and 2 is deleted. full syncs only
+# see unread items, so both are treated as removed from the library.
+REMOVED_STATUSES = ("1", "2")
+
+
+def _request_body(**kwargs) -> dict:
+    return {
+        "contentType": "article",
+        "detailType": "complete",
+        "offset": 0,  # zero based
+    } | kwargs
+
+
+def content_hash(item: dict) -> str:
+    content = [
+        item.get("resolved_title"),
+        item.get("excerpt"),
+        item.get("authors", {}),
+        item.get("listen_duration_estimate"),
+        sorted(
+            tag.get("tag")
+            for tag in item.get("tags", {}).values()
+            if tag.get("item_id")
+        ),
+    ]
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _item(item: dict) -> Item:
+    return Item(
+        id=int(item.get("item_id")),
+        authors=item.get("authors", {}),
+        excerpt=item.get("excerpt"),
+        resolved_title=item.get("resolved_title"),
+        listen_duration_estimate=item.get("listen_duration_estimate"),
+        content_hash=content_hash(item),
+        tags=tuple(
+            tag.get("tag")
+            for tag in item.get("tags", {}).values()
+            if tag.get("item_id")
+        ),
+    )
 
 
-async def _request(req: HttpRequest, method: str, url: str, **kwargs) -> Response:
-    try:
-        kwargs |= dict(headers=req.header)
-        async with req.session.request(method, url, ssl=True, **kwargs) as resp:
-            data = await resp.json()
-    except asyncio.TimeoutError:
-        logging.error(f"asyncio.TimeOutError {req.read_timeout}")
-        return ERROR_RESPONSE
-    except aiohttp.ClientResponseError as e:
-        logging.error(e)
-        await asyncio.sleep(3)
-        return ERROR_RESPONSE
-    else:
-        return Response(success=True, data=data)
-
-
-async def get_pocket_data(req, usr) -> List[ArticleModel]:
-    resp = await _request(
-        req,
-        aiohttp.hdrs.METH_POST,
-        f"{req.base_url}/v3/get",
-        json={
-            "consumer_key": get_pocket_consumer_key(),
-            "access_token": usr.extra_data.get("access_token", ""),
-            "contentType": "article",
-            "detailType": "complete",
-            "offset": 0,  # zero based
-        },
+def _article(item: Item, usr: UserSocialAuth) -> Article:
+    return Article(
+        item_id=item.id,
+        authors=item.authors,
+        excerpt=item.excerpt,
+        user_id=usr.user_id,
+        listen_duration_estimate=item.listen_duration_estimate,
+        resolved_title=item.resolved_title,
+        content_hash=item.content_hash,
     )
-    if not resp.success:
-        return []
+
+
+def _tags(article: Article, item: Item) -> List[Tag]:
+    # the article's id is only known once its batch is written, bulk_create
+    # picks it up from the related object as the tag batch runs after it
     return [
-        ArticleModel(
-            article=Article(
-                id=int(item.get("item_id")),
-                authors=item.get("authors", {}),
-                excerpt=item.get("excerpt"),
-                user=usr.user,
-                listen_duration_estimate=item.get("listen_duration_estimate"),
-                resolved_title=item.get("resolved_title"),
-            ),
-            tags=[
-                Tag(
-                    value=tag.get("tag"),
-                    article_id=tag.get("item_id"),
-                    user=usr.user,
-                )
-                for tag in item.get("tags", {}).values()
-                if tag.get("item_id")
-            ],
-        )
-        for _, item in resp.data.get("list", {}).items()
+        Tag(value=tag, article=article, user_id=article.user_id) for tag in item.tags
     ]
 
 
+async def read_page(resp: aiohttp.ClientResponse) -> Page:
+    """Decodes a /v3/get response item by item as the body streams in."""
+    page = Page()
+    # pocket returns an empty list instead of an object when nothing matched
+    async for key, value in iter_object(resp.content.iter_any(), expand="list"):
+        if key == "list":
+            page.count += 1
+            if value.get("status") in REMOVED_STATUSES:
+                page.removed.append(int(value.get("item_id")))
+            else:
+                page.items.append(_item(value))
+        elif key == "since":
+            page.since = value
+    return page
+
+
+async def get_pocket_page(
+    client: PocketClient,
+    budget: RetryBudget,
+    usr: UserSocialAuth,
+    offset: int,
+    count: int,
+    since: Optional[int] = None,
+) -> Page:
+    body = _request_body(offset=offset, count=count)
+    if since is not None:
+        body |= {"since": since, "state": "all"}
+    return await client.get(
+        budget, usr.extra_data.get("access_token", ""), read=read_page, **body
+    )
+
+
+async def get_pocket_pages(
+    client: PocketClient,
+    budget: RetryBudget,
+    usr: UserSocialAuth,
+    page_size: int = 30,
+    concurrency: int = 4,
+    since: Optional[int] = None,
+) -> AsyncIterator[Page]:
+    """Yields pages of the user's library as they arrive.
+
+    At most `concurrency` page requests are in flight at once. The total size
+    of the library is unknown up front, so pages are requested at increasing
+    offsets until one of them comes back short. When `since` is set only the
+    items changed after that timestamp are returned, including removed ones.
+    A failed page raises PocketError, an incomplete library is never yielded
+    as if it were whole.
+    """
+    pending: Set[asyncio.Future] = set()
+    done: Set[asyncio.Future] = set()
+    offset = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                pending.add(
+                    asyncio.ensure_future(
+                        get_pocket_page(
+                            client,
+                            budget,
+                            usr,
+                            offset=offset,
+                            count=page_size,
+                            since=since,
+                        )
+                    )
+                )
+                offset += page_size
+            if not pending:
+                return
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                page = task.result()
+                if page.count < page_size:
+                    exhausted = True
+                if page.count:
+                    yield page
+    finally:
+        for task in pending:
+            task.cancel()
+        # retrieves the outcome of every page, a failure raised above may
+        # not be the only one
+        await asyncio.gather(*pending, *done, return_exceptions=True)
+
+
 async def create_job_event(name: str, data: dict) -> Job:
     job = Job(name=name, data=data)
     await job.asave()
-    await job.arefresh_from_db()
     return job
 
 
-async def read_user(email: str) -> UserSocialAuth:
-    user = await User.objects.filter(
-        username=email,
-        is_superuser=False,
+async def read_users(user_ids: Optional[List[int]] = None) -> List[UserSocialAuth]:
+    query = UserSocialAuth.objects.filter(provider="pocket")
+    if user_ids is not None:
+        query = query.filter(user_id__in=user_ids)
+    return [usr async for usr in query.select_related("user").order_by("id")]
+
+
+async def read_last_sync(usr: UserSocialAuth) -> Optional[Job]:
+    return await Job.objects.filter(
+        name="library_sync",
+        status="success",
+        data__user_id=usr.user_id,
     ).afirst()
-    return await user.social_auth.afirst()
 
 
-def create_articles(data: List[Article], batch_size: int = 10) -> List[Task]:
-    return [
-        asyncio.ensure_future(
-            Article.objects.abulk_create(
-                data[i : i + batch_size],
-                ignore_conflicts=True,
-                update_fields=[
-                    "authors",
-                    "excerpt",
-                    "slug",
-                    "resolved_title",
-                    "listen_duration_estimate",
-                ],
-                unique_fields=["id"],
-            )
+def sync_mode(last: Optional[Job], full: bool, now: float, interval: float) -> str:
+    if full or last is None or last.data.get("since") is None:
+        return "full"
+    if now - last.data.get("full_sync_at", 0) >= interval:
+        return "full"
+    return "delta"
+
+
+def diff_articles(items: List[Item], existing: ArticleIndex) -> Diff:
+    diff = Diff()
+    for item in items:
+        unchanged = existing.matches(item.id, item.content_hash)
+        if unchanged is None:
+            diff.insert.append(item)
+        elif not unchanged:
+            diff.update.append(item)
+        else:
+            diff.unchanged += 1
+    return diff
+
+
+async def create_articles(writer: BulkWriter, data: List[Article]) -> None:
+    await writer.write(
+        Article,
+        data,
+        update_conflicts=True,
+        update_fields=[
+            "authors",
+            "excerpt",
+            "resolved_title",
+            "listen_duration_estimate",
+            "content_hash",
+            "updated_at",
+        ],
+        unique_fields=["user", "item_id"],
+    )
+
+
+async def delete_articles(
+    writer: BulkWriter, usr: UserSocialAuth, data: List[int]
+) -> None:
+    if data:
+        await writer.run(
+            Article.objects.filter(user_id=usr.user_id, item_id__in=data).delete
         )
-        for i in range(0, len(data), batch_size)
-    ]
 
 
-async def delete_articles(data: List[Article]) -> List[int]:
-    return await Article.objects.filter(id__in=data).adelete()
+async def read_articles(
+    usr: UserSocialAuth,
+    ids: Optional[List[int]] = None,
+    index: Optional[ArticleIndex] = None,
+    chunk_size: int = 2000,
+) -> ArticleIndex:
+    """Streams the user's pocket item ids and hashes into an ArticleIndex.
+
+    Rows arrive in id order, `chunk_size` at a time, so memory stays flat no
+    matter how large the table grows. When `index` is given the rows are
+    merged into it instead of a new index.
+    """
+    query = (
+        Article.objects.filter(user_id=usr.user_id)
+        .order_by("item_id")
+        .values_list("item_id", "content_hash")
+    )
+    if ids is not None:
+        query = query.filter(item_id__in=ids)
+    if index is None:
+        index = ArticleIndex()
+        add = index.append
+    else:
+        add = index.add
+    async for article_id, digest in query.aiterator(chunk_size=chunk_size):
+        add(article_id, digest)
+    return index
+
+
+async def delete_tags(
+    writer: BulkWriter, usr: UserSocialAuth, item_ids: List[int]
+) -> None:
+    if item_ids:
+        await writer.run(
+            Tag.objects.filter(
+                user_id=usr.user_id, article__item_id__in=item_ids
+            ).delete
+        )
 
 
-async def read_articles() -> List[int]:
-    return [
-        article_id
-        async for article_id in Article.objects.values_list("id", flat=True).all()
-    ]
+async def create_tags(writer: BulkWriter, data: List[Tag]) -> None:
+    await writer.write(Tag, data)
 
 
-def create_tags(data: List[Tag], batch_size: int = 10) -> List[Task]:
-    return [
-        asyncio.ensure_future(
-            Tag.objects.abulk_create(
-                data[i : i + batch_size],
-                update_fields=["value"],
-                unique_fields=["id"],
-            )
+ARTICLE_COLUMNS = (
+    "item_id",
+    "authors",
+    "excerpt",
+    "slug",
+    "resolved_title",
+    "listen_duration_estimate",
+    "content_hash",
+    "user_id",
+    "created_at",
+    "updated_at",
+)
+TAG_COLUMNS = ("value", "article_id", "user_id", "created_at", "updated_at")
+# staged tags refer to their article by pocket item id, the article's own id
+# is only known once the staged articles are merged
+STAGED_TAG_COLUMNS = ("value", "item_id", "user_id", "created_at", "updated_at")
+
+
+def use_copy(requested: bool, mode: str, existing: ArticleIndex, vendor: str) -> bool:
+    """COPY is postgres only, and pays off for cold imports of a whole library."""
+    if vendor != "postgresql":
+        return False
+    return requested or (mode == "full" and not existing)
+
+
+def _staging(table: str) -> str:
+    return f"{table}_staging"
+
+
+def create_staging_tables() -> None:
+    article_table = Article._meta.db_table
+    tag_table = Tag._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {_staging(article_table)} ON COMMIT DROP AS "
+            f"SELECT {', '.join(ARTICLE_COLUMNS)} FROM {article_table} WITH NO DATA"
+        )
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {_staging(tag_table)} ON COMMIT DROP AS "
+            f"SELECT t.value, a.item_id, t.user_id, t.created_at, t.updated_at "
+            f"FROM {tag_table} t JOIN {article_table} a ON a.id = t.article_id "
+            f"WITH NO DATA"
         )
-        for i in range(0, len(data), batch_size)
-    ]
 
 
-async def main():
-    usr, event = await asyncio.gather(
-        read_user("14benj@gmail.com"),
+def copy_articles(usr: UserSocialAuth, items: List[Item]) -> None:
+    now = timezone.now()
+    article_table = _staging(Article._meta.db_table)
+    tag_table = _staging(Tag._meta.db_table)
+    with connection.cursor() as cursor:
+        with cursor.copy(
+            f"COPY {article_table} ({', '.join(ARTICLE_COLUMNS)}) FROM STDIN"
+        ) as copy:
+            for item in items:
+                copy.write_row(
+                    (
+                        item.id,
+                        Jsonb(item.authors),
+                        item.excerpt or "",
+                        uuid.uuid4(),
+                        item.resolved_title or "",
+                        item.listen_duration_estimate or 0,
+                        item.content_hash,
+                        usr.user_id,
+                        now,
+                        now,
+                    )
+                )
+        with cursor.copy(
+            f"COPY {tag_table} ({', '.join(STAGED_TAG_COLUMNS)}) FROM STDIN"
+        ) as copy:
+            for item in items:
+                for tag in item.tags:
+                    copy.write_row((tag, item.id, usr.user_id, now, now))
+
+
+def merge_staging_tables() -> Dict[str, int]:
+    article_table = Article._meta.db_table
+    tag_table = Tag._meta.db_table
+    updates = ", ".join(
+        f"{column} = EXCLUDED.{column}"
+        for column in ARTICLE_COLUMNS
+        if column not in ("item_id", "slug", "user_id", "created_at")
+    )
+    with connection.cursor() as cursor:
+        # a library that shifts between page requests can repeat an item
+        cursor.execute(
+            f"INSERT INTO {article_table} ({', '.join(ARTICLE_COLUMNS)}) "
+            f"SELECT DISTINCT ON (user_id, item_id) {', '.join(ARTICLE_COLUMNS)} "
+            f"FROM {_staging(article_table)} ORDER BY user_id, item_id "
+            f"ON CONFLICT (user_id, item_id) DO UPDATE SET {updates} "
+            f"WHERE {article_table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash"
+        )
+        articles = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {tag_table} ({', '.join(TAG_COLUMNS)}) "
+            f"SELECT s.value, a.id, s.user_id, s.created_at, s.updated_at "
+            f"FROM {_staging(tag_table)} s JOIN {article_table} a "
+            f"ON a.user_id = s.user_id AND a.item_id = s.item_id "
+            f"ON CONFLICT DO NOTHING"
+        )
+        tags = cursor.rowcount
+    return {"articles": articles, "tags": tags}
+
+
+async def sync_user(
+    client: PocketClient,
+    usr: UserSocialAuth,
+    full: bool = False,
+    bulk_load: bool = False,
+) -> Job:
+    event, last = await asyncio.gather(
         create_job_event(
             name="library_sync",
-            data={"version": "1"},
+            data={"version": "1", "user_id": usr.user_id},
         ),
+        read_last_sync(usr),
     )
-    async with aiohttp.ClientSession(
-        trust_env=False,
-        raise_for_status=True,
-        timeout=aiohttp.ClientTimeout(total=READ_TIMEOUT),
-    ) as session:
-        items, existing_articles = await asyncio.gather(
-            get_pocket_data(HttpRequest(session=session), usr),
-            read_articles(),
-        )
-        raw_source_ids = [item.article.id for item in items]
-    new_articles = [
-        item.article for item in items if item.article.id not in existing_articles
-    ]
-    to_delete = [
-        article for article in existing_articles if article not in raw_source_ids
-    ]
-    await asyncio.gather(*create_articles(new_articles), delete_articles(to_delete))
-    new_tags = [
-        tag
-        for item in items
-        for tag in item.tags
-        if item.article.id not in existing_articles
-    ]
-    await asyncio.gather(*create_tags(new_tags))
+    now = time.time()
+    mode = sync_mode(last, full, now, get_pocket_full_sync_interval())
+    since = last.data["since"] if mode == "delta" else None
+    # a delta only needs to know which of its own items are already stored
+    existing_articles = await read_articles(usr) if mode == "full" else ArticleIndex()
+    totals: Counter = Counter()
+    removed: List[int] = []
+    cursors: List[Optional[int]] = []
+    copy = use_copy(bulk_load, mode, existing_articles, connection.vendor)
+    merged: Dict[str, int] = {}
+    budget = RetryBudget(get_pocket_retry_budget())
+    writer = BulkWriter(
+        batch_size=get_bulk_batch_size(), max_pending=get_bulk_max_pending()
+    )
+    try:
+        async with writer:
+            if copy:
+                await writer.run(create_staging_tables)
+            async for page in get_pocket_pages(
+                client,
+                budget,
+                usr,
+                page_size=get_pocket_page_size(),
+                concurrency=get_pocket_concurrency(),
+                since=since,
+            ):
+                removed.extend(page.removed)
+                cursors.append(page.since)
+                if mode == "delta":
+                    await read_articles(
+                        usr,
+                        ids=[item.id for item in page.items],
+                        index=existing_articles,
+                    )
+                for item in page.items:
+                    existing_articles.mark(item.id)
+                diff = diff_articles(page.items, existing_articles)
+                totals.update(
+                    items=len(page.items),
+                    inserted=len(diff.insert),
+                    updated=len(diff.update),
+                    unchanged=diff.unchanged,
+                    new_tags=sum(len(item.tags) for item in diff.changed),
+                )
+                # write the page while later pages are in flight, nothing is
+                # kept once its batches are queued
+                await delete_tags(writer, usr, [item.id for item in diff.update])
+                if copy:
+                    await writer.run(copy_articles, usr, diff.changed)
+                    continue
+                articles = [_article(item, usr) for item in diff.changed]
+                await create_articles(writer, articles)
+                # batches run in order, so the articles land before their tags
+                await create_tags(
+                    writer,
+                    [
+                        tag
+                        for article, item in zip(articles, diff.changed)
+                        for tag in _tags(article, item)
+                    ],
+                )
+            if mode == "full":
+                to_delete = list(existing_articles.unseen())
+            else:
+                to_delete = removed
+            await delete_articles(writer, usr, to_delete)
+            await writer.flush()
+            if copy:
+                merged = await writer.run(merge_staging_tables)
+    except Exception:
+        event.status = "error"
+        event.data |= {"writer": writer.stats(), "retries": budget.spent}
+        await event.asave()
+        raise
+    # resume from the oldest page cursor; when a page carried none keep the
+    # previous cursor so its changes are fetched again next time
+    if cursors and None not in cursors:
+        next_since = min(cursors)
+    else:
+        next_since = since
     event.status = "success"
     event.data = {
         "version": "1",
+        "user_id": usr.user_id,
+        "mode": mode,
+        "since": next_since,
+        "full_sync_at": now if mode == "full" else last.data.get("full_sync_at"),
         "results": {
             "existing_articles": len(existing_articles),
-            "new_articles": len(new_articles),
-            "new_tags": len(new_tags),
-            "raw_items": len(items),
+            "raw_items": totals["items"] + len(removed),
+            "inserted": totals["inserted"],
+            "updated": totals["updated"],
+            "unchanged": totals["unchanged"],
+            "deleted": len(to_delete),
+            "new_tags": totals["new_tags"],
         },
+        "writer": writer.stats() | {"copy": copy, "merged": merged},
+        "retries": budget.spent,
     }
     await event.asave()
+    return event
+
+
+def pocket_client() -> PocketClient:
+    return PocketClient(
+        get_pocket_consumer_key(),
+        rate=get_pocket_rate_limit(),
+        burst=get_pocket_rate_burst(),
+        max_retries=get_pocket_max_retries(),
+        read_timeout=READ_TIMEOUT,
+        connection_limit=get_pocket_connection_limit(),
+    )
+
+
+async def main(
+    full: bool = False,
+    bulk_load: bool = False,
+    pool_size: Optional[int] = None,
+    user_ids: Optional[List[int]] = None,
+    client: Optional[PocketClient] = None,
+):
+    """Syncs every pocket linked user, or only user_ids, with at most pool_size
+    syncs at once.
+
+    Each user gets their own job and transaction, a failed sync is logged and
+    does not stop the others. Long running callers pass in their own client
+    so every sync shares its rate limit and connections.
+    """
+    pool_size = pool_size or get_library_sync_pool_size()
+    queue: asyncio.Queue[UserSocialAuth] = asyncio.Queue()
+    for usr in await read_users(user_ids):
+        queue.put_nowait(usr)
+
+    async def worker(client: PocketClient) -> None:
+        while True:
+            try:
+                usr = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await sync_user(client, usr, full=full, bulk_load=bulk_load)
+            except Exception:
+                logging.exception("unable to sync library for user %s", usr.user_id)
+
+    async with contextlib.AsyncExitStack() as stack:
+        if client is None:
+            client = await stack.enter_async_context(pocket_client())
+        await asyncio.gather(
+            *(worker(client) for _ in range(min(pool_size, queue.qsize())))
+        )
+    metrics.log()
 
 
 class Command(BaseCommand):
     help = "Start Pocket API Sync"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Re-download the whole library instead of the latest changes",
+        )
+        parser.add_argument(
+            "--bulk-load",
+            action="store_true",
+            help="Import through postgres COPY, falls back to the ORM elsewhere",
+        )
+        parser.add_argument(
+            "--pool-size",
+            type=int,
+            help="Number of users to sync at once",
+        )
+
     def handle(self, *args, **options) -> None:
         self.stdout.write(self.style.SUCCESS("syncing library"))
         trace_start = time.perf_counter()
-        asyncio.run(main())
+        asyncio.run(
+            main(
+                full=options.get("full", False),
+                bulk_load=options.get("bulk_load", False),
+                pool_size=options.get("pool_size"),
+            )
+        )
         duration = time.perf_counter() - trace_start
         self.stdout.write(
             self.style.SUCCESS(f"finished syncing library in {duration:0.3f}s")
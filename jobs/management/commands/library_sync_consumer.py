@@ -1,21 +1,113 @@
 import asyncio
+import functools
 import json
 import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set
 
 import aio_pika
 import aio_pika.abc
 from django.core.management.base import BaseCommand
 
-from scrutiny.env import get_rmq_dsn  # noqa
-from .library_sync import main
+from scrutiny.env import (  # noqa
+    get_library_sync_min_interval,
+    get_library_sync_pool_size,
+    get_metrics_log_interval,
+    get_rmq_dsn,
+)
+from jobs.metrics import Metrics, metrics as default_metrics
+from jobs.pocket import PocketClient
+from .library_sync import main, pocket_client
 
 logger = logging.getLogger(__name__)
 
 
+class SyncScheduler:
+    """Coalesces library sync triggers per user.
+
+    A trigger for a user whose sync is already queued merges into it, and one
+    arriving while the sync runs queues a single follow up, as the running
+    sync may have missed what it was about. Otherwise triggers within
+    `min_interval` seconds of the user's last sync are skipped unless they ask
+    for a full sync. At most `concurrency` syncs run at once.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[Optional[int], bool], Awaitable[None]],
+        min_interval: float = 300.0,
+        concurrency: int = 4,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.run = run
+        self.min_interval = min_interval
+        self.metrics = metrics or default_metrics
+        # user id to whether any of the merged triggers asked for a full sync
+        self.pending: Dict[Optional[int], bool] = {}
+        self.running: Set[Optional[int]] = set()
+        self.started: Dict[Optional[int], float] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(concurrency)
+
+    def trigger(self, user_id: Optional[int], full: bool = False) -> bool:
+        """Returns whether the trigger led to a new sync."""
+        self.metrics.incr("library_sync.triggers")
+        if user_id in self.pending:
+            self.pending[user_id] |= full
+            self.metrics.incr("library_sync.coalesced")
+            return False
+        last = self.started.get(user_id)
+        if not full and last is not None and user_id not in self.running:
+            if time.monotonic() - last < self.min_interval:
+                self.metrics.incr("library_sync.skipped")
+                return False
+        self.pending[user_id] = full
+        if user_id not in self.running:
+            task = asyncio.ensure_future(self._drain(user_id))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        return True
+
+    async def join(self) -> None:
+        while self.tasks:
+            await asyncio.gather(*self.tasks)
+
+    async def _drain(self, user_id: Optional[int]) -> None:
+        self.running.add(user_id)
+        try:
+            while user_id in self.pending:
+                async with self._slots:
+                    # triggers keep merging until a slot frees up
+                    full = self.pending.pop(user_id)
+                    self.started[user_id] = time.monotonic()
+                    self.metrics.incr("library_sync.runs")
+                    try:
+                        await self.run(user_id, full)
+                    except Exception:
+                        logger.exception("unable to sync library for %s", user_id)
+        finally:
+            self.running.discard(user_id)
+
+
+async def sync(client: PocketClient, user_id: Optional[int], full: bool) -> None:
+    await main(
+        full=full, user_ids=None if user_id is None else [user_id], client=client
+    )
+
+
 async def consume(loop: asyncio.AbstractEventLoop, dsn: str) -> None:
     logger.debug("connecting to rmq...")
+    reporter = asyncio.ensure_future(default_metrics.report(get_metrics_log_interval()))
+    # one client for the consumer's lifetime, so concurrent syncs share its
+    # rate limit and connection pool
+    client = pocket_client()
+    scheduler = SyncScheduler(
+        functools.partial(sync, client),
+        min_interval=get_library_sync_min_interval(),
+        concurrency=get_library_sync_pool_size(),
+    )
     connection = await aio_pika.connect_robust(dsn, loop=loop)
-    async with connection:
+    async with connection, client:
         queue_name = "library-sync"
         channel: aio_pika.abc.AbstractChannel = await connection.channel()
         queue: aio_pika.abc.AbstractQueue = await channel.declare_queue(
@@ -26,11 +118,9 @@ async def consume(loop: asyncio.AbstractEventLoop, dsn: str) -> None:
                 await message.ack()
                 msg = json.loads(message.body.decode())
                 logger.info("message %s", msg)
-                try:
-                    await main()
-                except Exception:
-                    logging.exception("unable to process message %s", msg)
-                    continue
+                scheduler.trigger(msg.get("user_id"), full=msg.get("full", False))
+        await scheduler.join()
+    reporter.cancel()
 
 
 class Command(BaseCommand):
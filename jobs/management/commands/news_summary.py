@@ -1,7 +1,22 @@
 import asyncio
+import contextlib
 import hashlib
 import logging
-from typing import TypedDict
+import time
+from collections import deque
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypedDict,
+)
 
 from asgiref.sync import sync_to_async
 from collections.abc import AsyncIterable
@@ -11,12 +26,32 @@ import aiohttp
 from django.template.loader import render_to_string
 from django.core.management.base import BaseCommand
 from pydantic import BaseModel, ConfigDict
+from pydantic_core import from_json
 
+from jobs.metrics import metrics, percentile
 from jobs.models import Job  # noqa
-from news.models import FeedRegistry, parse_feed  # noqa
+from jobs.prompt import build_prompt
+from jobs.scheduler import BACKGROUND, INTERACTIVE, Overloaded, Scheduler
+from jobs.stream import iter_lines
+from news.models import Feed, FeedRegistry, parse_feed  # noqa
 from scrutiny.env import (  # noqa
+    get_job_claim_timeout,
+    get_llm_concurrency,
+    get_llm_max_queue_wait,
+    get_mercure_connection_limit,
     get_mercure_svc_url,
     get_mercure_pub_token,
+    get_news_summary_batch_concurrency,
+    get_news_summary_excerpt_size,
+    get_news_summary_flush_interval,
+    get_news_summary_flush_size,
+    get_news_summary_poll_interval,
+    get_news_summary_presence_interval,
+    get_news_summary_prompt_tokens,
+    get_news_summary_publish_mode,
+    get_news_summary_queue_size,
+    get_news_summary_time_budget,
+    get_ollama_connection_limit,
     get_ollama_svc_url,
 )
 
@@ -28,115 +63,321 @@ class HttpRequest(BaseModel):
     session: aiohttp.ClientSession
 
 
-class Token(BaseModel):
+# decoded for every token of every summary, parsing with pydantic_core and
+# skipping model validation halves the cost of model_validate_json
+class Token(NamedTuple):
     done: bool
     model: str
     response: str
 
 
+def decode_token(line: bytes) -> Token:
+    data = from_json(line)
+    return Token(
+        done=data.get("done", False),
+        model=data.get("model", ""),
+        response=data.get("response", ""),
+    )
+
+
 class JobArgs(TypedDict):
     version: str
     key: str
+    feed_id: str
 
 
 READ_TIMEOUT = 300.0
 SEND_TIMEOUT = 10.0
 
 
-async def _read_tokens(req: HttpRequest, **kwargs) -> AsyncIterable[Token, None]:
+class TokenBuffer:
+    """Batches streamed tokens into one delta per window.
+
+    A delta is ready once `size` characters are buffered or `interval`
+    seconds have passed since the last one was taken.
+    """
+
+    def __init__(self, interval: float = 0.25, size: int = 256):
+        self.interval = interval
+        self.size = size
+        self.parts: List[str] = []
+        self.length = 0
+        self.taken_at = time.monotonic()
+
+    def add(self, token: str) -> Optional[str]:
+        """Buffers token and returns the pending delta when the window closes."""
+        self.parts.append(token)
+        self.length += len(token)
+        if (
+            self.length >= self.size
+            or time.monotonic() - self.taken_at >= self.interval
+        ):
+            return self.take()
+        return None
+
+    def take(self) -> str:
+        delta = "".join(self.parts)
+        self.parts.clear()
+        self.length = 0
+        self.taken_at = time.monotonic()
+        return delta
+
+
+class DeltaQueue:
+    """Bounded queue of summary deltas from the token reader to the publisher.
+
+    Putting never waits, so a slow Mercure hub can not stall the Ollama
+    stream. Once `maxsize` deltas are queued a new one merges into the newest
+    entry and Mercure receives fewer, larger updates.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        # [delta, monotonic time the oldest text in it was queued]
+        self.items: Deque[list] = deque()
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def put(self, delta: str) -> None:
+        if len(self.items) >= self.maxsize:
+            self.items[-1][0] += delta
+            metrics.incr("news_summary.merged")
+        else:
+            self.items.append([delta, time.monotonic()])
+        metrics.gauge("news_summary.queue_depth", len(self.items))
+        self._ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def get(self) -> Optional[Tuple[str, float]]:
+        """Returns the oldest delta, or None once the queue is closed and drained."""
+        while not self.items:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        delta, queued_at = self.items.popleft()
+        metrics.gauge("news_summary.queue_depth", len(self.items))
+        return delta, queued_at
+
+
+async def stream_summary(
+    tokens: AsyncIterable[str],
+    publish: Callable[[str], Awaitable[None]],
+    buffer: TokenBuffer,
+    queue: DeltaQueue,
+    parts: Optional[List[str]] = None,
+) -> str:
+    """Reads tokens and publishes them as deltas from two separate tasks.
+
+    Returns the whole summary, tokens are also collected into `parts` so a
+    caller keeps what was read when either task fails. A failure cancels the
+    other task and is raised.
+    """
+    parts = [] if parts is None else parts
+
+    async def read() -> None:
+        try:
+            # closing the generator releases whatever it holds, such as its
+            # slot with the LLM scheduler
+            async with contextlib.aclosing(tokens) as stream:
+                async for token in stream:
+                    parts.append(token)
+                    delta = buffer.add(token)
+                    if delta:
+                        queue.put(delta)
+            delta = buffer.take()
+            if delta:
+                queue.put(delta)
+        finally:
+            queue.close()
+
+    async def write() -> None:
+        while (item := await queue.get()) is not None:
+            delta, queued_at = item
+            await publish(delta)
+            metrics.observe("news_summary.publish_lag", time.monotonic() - queued_at)
+
+    tasks = [asyncio.ensure_future(read()), asyncio.ensure_future(write())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+        # the reader finished first, let the publisher drain what is queued
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return "".join(parts)
+
+
+async def _read_tokens(
+    req: HttpRequest, base_url: Optional[str] = None, **kwargs
+) -> AsyncIterable[Token, None]:
     async with req.session.request(
         aiohttp.hdrs.METH_POST,
-        f"{get_ollama_svc_url()}/api/generate",
+        f"{base_url or get_ollama_svc_url()}/api/generate",
         ssl=False,
         **kwargs,
     ) as resp:
-        async for chunk, valid in resp.content.iter_chunks():
-            if not valid:
-                return
-            yield Token.model_validate_json(chunk)
+        async for line in iter_lines(resp.content.iter_any()):
+            yield decode_token(line)
+
+
+# created on first use so tests and commands can configure it with settings
+_llm_scheduler: Optional[Scheduler] = None
+
+
+def llm_scheduler() -> Scheduler:
+    """Returns the scheduler every generation in this process queues on.
+
+    The warmer runs inside the consumer, `news_summary_consumer --warm`, so
+    its generations queue here behind interactive ones.
+    """
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        _llm_scheduler = Scheduler(
+            "llm",
+            concurrency=get_llm_concurrency(),
+            max_wait=get_llm_max_queue_wait(),
+        )
+    return _llm_scheduler
 
 
-async def read_tokens(req: HttpRequest, titles: str) -> AsyncIterable[str, None]:
-    prompt = f"""You are advanced chatbot Editor-in-chief Assistant. You can help users
-    with editorial tasks, including proofreading and reviewing articles. Your ultimate goal
-    is to help users create high-quality content. The user will give you a text to summarize,
-    you will do so without making any comments on the subject, don't leave important details out.
-    Provide a summary paragraph for these article titles, {titles}.
+class Stages:
+    """Timings of one summary's stages, kept for its job and observed as metrics."""
+
+    def __init__(self):
+        self.stats: Dict[str, float] = {}
+
+    def record(self, stage: str, value: float) -> None:
+        self.stats[stage] = round(value, 4)
+        metrics.observe(f"news_summary.{stage}", value)
+
+    @contextlib.contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - started)
+
+
+async def read_tokens(
+    req: HttpRequest,
+    prompt: str,
+    priority: int = INTERACTIVE,
+    stages: Optional[Stages] = None,
+) -> AsyncIterable[str, None]:
+    """Streams the generated tokens, recording time to first token and rate.
+
+    The clock starts once the request holds its LLM slot, so the time to
+    first token measures Ollama's prompt prefill rather than the queue in
+    front of it. The rate counts the tokens decoded after the first one.
     """
+    stages = Stages() if stages is None else stages
     data = {"model": "orca-mini", "prompt": prompt}
-    async for token in _read_tokens(req, json=data):
-        yield token.response
-        if token.done:
-            return
+    async with llm_scheduler().slot(priority):
+        started = time.monotonic()
+        first: Optional[float] = None
+        count = 0
+        try:
+            async for token in _read_tokens(req, json=data):
+                count += 1
+                if first is None:
+                    first = time.monotonic()
+                    stages.record("time_to_first_token", first - started)
+                yield token.response
+                if token.done:
+                    return
+        finally:
+            stages.stats["tokens"] = count
+            if count > 1:
+                elapsed = max(time.monotonic() - first, 1e-6)
+                stages.record("tokens_per_second", (count - 1) / elapsed)
 
 
-async def send(req: HttpRequest, summary: str) -> None:
-    msg = await sync_to_async(render_to_string)(
-        "news/news_summary.html", {"summary": summary}
-    )
-    await req.session.request(
+async def publish(req: HttpRequest, target: str, msg: str) -> None:
+    async with req.session.request(
         aiohttp.hdrs.METH_POST,
         get_mercure_svc_url(),
         ssl=False,
         data=parse.urlencode(
-            {"target": "news-summary", "topic": ["news-summary"], "data": msg},
+            {"target": target, "topic": ["news-summary"], "data": msg},
             True,
         ),
-    )
+    ) as resp:
+        # reading the body hands the connection back to the pool
+        await resp.read()
 
 
-async def send_job_created(req: HttpRequest, job: Job) -> None:
+async def subscribers(req: HttpRequest, topic: str = "news-summary") -> Optional[int]:
+    """Counts the hub's subscribers to topic, None when the hub won't tell."""
+    url = f"{get_mercure_svc_url()}/subscriptions/{parse.quote(topic, safe='')}"
+    try:
+        async with req.session.get(url, ssl=False) as resp:
+            data = await resp.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        # the subscriptions API is opt-in on the hub and needs a token that
+        # may subscribe to it
+        logger.debug("unable to read subscriptions to %s", topic, exc_info=True)
+        return None
+    return len(data.get("subscriptions", []))
+
+
+async def send(
+    req: Optional[HttpRequest],
+    summary: str,
+    feed_id: str,
+    template: str = "news/news_summary.html",
+) -> None:
+    if req is None:
+        return
     msg = await sync_to_async(render_to_string)(
-        "jobs/on_job_created.html", {"job": job}
-    )
-    await req.session.request(
-        aiohttp.hdrs.METH_POST,
-        get_mercure_svc_url(),
-        ssl=False,
-        data=parse.urlencode(
-            {"target": "jobs-table", "topic": ["news-summary"], "data": msg},
-            True,
-        ),
+        template, {"summary": summary, "feed_id": feed_id}
     )
+    metrics.incr("news_summary.publishes")
+    metrics.incr("news_summary.published_bytes", len(msg))
+    await publish(req, "news-summary", msg)
 
 
-async def send_job_update(req: HttpRequest, job: Job) -> None:
-    msg = await sync_to_async(render_to_string)("jobs/on_job_update.html", {"job": job})
-    await req.session.request(
-        aiohttp.hdrs.METH_POST,
-        get_mercure_svc_url(),
-        ssl=False,
-        data=parse.urlencode(
-            {"target": f"job-{job.id}", "topic": ["news-summary"], "data": msg},
-            True,
-        ),
+async def send_job_created(req: Optional[HttpRequest], job: Job) -> None:
+    if req is None:
+        return
+    msg = await sync_to_async(render_to_string)(
+        "jobs/on_job_created.html", {"job": job}
     )
+    await publish(req, "jobs-table", msg)
 
 
-async def get_job_event(name: str, data: JobArgs) -> Job:
-    job = await Job.objects.filter(
-        name=name,
-        data__key=data.get("key"),
-        data__version=data.get("version"),
-    ).afirst()
-    return job
+async def send_job_update(req: Optional[HttpRequest], job: Job) -> None:
+    if req is None:
+        return
+    msg = await sync_to_async(render_to_string)("jobs/on_job_update.html", {"job": job})
+    await publish(req, f"job-{job.id}", msg)
 
 
-async def create_job_event(name: str, data: JobArgs) -> Job:
-    job = Job(name=name, data=data)
-    await job.asave()
-    await job.arefresh_from_db()
-    return job
+async def claim_job_event(name: str, data: JobArgs) -> Tuple[Job, bool]:
+    return await Job.objects.aclaim(
+        name,
+        data["key"],
+        data["version"],
+        data,
+        stale_after=get_job_claim_timeout(),
+    )
 
 
-async def get_summary() -> None:
+def mercure_session(limit: int = 10) -> aiohttp.ClientSession:
     pub_token = get_mercure_pub_token()
     if not pub_token:
         raise EnvironmentError("missing jwt publish token")
-
-    mercure_session = aiohttp.ClientSession(
+    return aiohttp.ClientSession(
         trust_env=False,
         raise_for_status=True,
+        connector=aiohttp.TCPConnector(limit=limit),
         timeout=aiohttp.ClientTimeout(total=SEND_TIMEOUT),
         headers={
             "Authorization": f"Bearer {pub_token}",
@@ -144,93 +385,469 @@ async def get_summary() -> None:
         },
     )
 
-    try:
-        logger.debug("chat client started...")
-        await send(HttpRequest(session=mercure_session), "Chat client started...")
-    except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError):
-        logger.exception("failed send to client")
-        await mercure_session.close()
-        return
 
-    feed = FeedRegistry.get("hackernews")
-    context = {}
-    context = await sync_to_async(parse_feed)(context, feed)
+def ollama_session(limit: int = 4) -> aiohttp.ClientSession:
+    return aiohttp.ClientSession(
+        trust_env=False,
+        raise_for_status=True,
+        connector=aiohttp.TCPConnector(limit=limit),
+        timeout=aiohttp.ClientTimeout(total=READ_TIMEOUT),
+    )
+
 
-    titles = "; ".join([itm.get("title") for itm in context.get("items", [])])
+@contextlib.asynccontextmanager
+async def sessions(
+    mercure: Optional[aiohttp.ClientSession], ollama: Optional[aiohttp.ClientSession]
+) -> AsyncIterator[Tuple[HttpRequest, HttpRequest]]:
+    """Opens whichever of the two sessions the caller did not pass in."""
+    async with contextlib.AsyncExitStack() as stack:
+        if mercure is None:
+            mercure = await stack.enter_async_context(
+                mercure_session(get_mercure_connection_limit())
+            )
+        if ollama is None:
+            ollama = await stack.enter_async_context(
+                ollama_session(get_ollama_connection_limit())
+            )
+        yield HttpRequest(session=mercure), HttpRequest(session=ollama)
+
+
+def titles_key(titles: str) -> str:
     h = hashlib.new("sha256")
     h.update(titles.encode())
-    key = h.hexdigest()
+    return h.hexdigest()
 
-    event = await get_job_event(
-        name="news_summary",
-        data={"key": key, "version": "1"},
-    )
 
-    if event is not None and event.status == "success":
+def join_titles(items: List[dict]) -> str:
+    return "; ".join([itm.get("title") for itm in items])
+
+
+async def read_items(feed: Feed) -> List[dict]:
+    # parsing is network bound and never touches the database, so feeds are
+    # parsed on worker threads in parallel rather than on the shared one
+    context = await sync_to_async(parse_feed, thread_sensitive=False)({}, feed)
+    return context.get("items", [])
+
+
+async def get_summary(
+    feed_id: str = "hackernews",
+    mercure: Optional[aiohttp.ClientSession] = None,
+    ollama: Optional[aiohttp.ClientSession] = None,
+) -> None:
+    """Summarizes the latest news of a feed and streams it to Mercure subscribers.
+
+    Long running callers pass in their own sessions so connections are kept
+    alive across summaries, any session not given is opened for this call.
+    """
+    async with sessions(mercure, ollama) as (mercure_req, ollama_req):
+        await summarize_feed(mercure_req, ollama_req, feed_id)
+
+
+async def get_summaries(
+    feed_ids: Optional[List[str]] = None,
+    concurrency: Optional[int] = None,
+    mercure: Optional[aiohttp.ClientSession] = None,
+    ollama: Optional[aiohttp.ClientSession] = None,
+) -> None:
+    """Summarizes every registered feed, or only feed_ids.
+
+    All feeds are fetched at once, then at most `concurrency` summaries are
+    generated at a time. Each is stored under its own titles key, so a feed
+    whose news has not changed is served from its job. A failing feed is
+    logged and does not stop the others.
+    """
+    feeds = FeedRegistry.feeds()
+    if feed_ids is not None:
+        feeds = [feed for feed in feeds if feed.id in feed_ids]
+    slots = asyncio.Semaphore(concurrency or get_news_summary_batch_concurrency())
+    async with sessions(mercure, ollama) as (mercure_req, ollama_req):
+        items = await asyncio.gather(
+            *(read_items(feed) for feed in feeds), return_exceptions=True
+        )
+
+        async def summarize(feed: Feed, feed_items) -> None:
+            if isinstance(feed_items, Exception):
+                logger.error("unable to read feed %s: %r", feed.id, feed_items)
+                return
+            async with slots:
+                try:
+                    await summarize_feed(
+                        mercure_req, ollama_req, feed.id, feed_items, BACKGROUND
+                    )
+                except Exception:
+                    logger.exception("unable to summarize feed %s", feed.id)
+
+        await asyncio.gather(
+            *(summarize(feed, feed_items) for feed, feed_items in zip(feeds, items))
+        )
+
+
+class Flight:
+    """A summary being generated for a titles key.
+
+    Requests for the same key subscribe to it instead of starting another
+    generation. Every request publishes to the same Mercure topic, so all a
+    subscriber is missing is the text appended before it arrived; `resync`
+    asks the leader to send the whole text with its next update.
+
+    Interactive requests may `leave`, the generation is cancelled once every
+    request has left. Quiet requests from the warmer or a batch never leave.
+    """
+
+    def __init__(self, feed_id: str, interactive: bool = True):
+        self.feed_id = feed_id
+        self.resync = False
+        # quiet leaders publish nothing, their subscribers send the result
+        self.publishing = interactive
+        self.listeners = 0
+        self.interactive = 0
+        self.reason: Optional[str] = None
+        self.cancelled = asyncio.Event()
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.join(interactive)
+
+    def join(self, interactive: bool) -> None:
+        self.listeners += 1
+        self.interactive += interactive
+
+    def leave(self) -> None:
+        if not self.interactive:
+            return
+        self.interactive -= 1
+        self.listeners -= 1
+        if not self.listeners:
+            self.cancel("cancelled")
+
+    def cancel(self, reason: str) -> None:
+        if self.reason is None:
+            self.reason = reason
+            self.cancelled.set()
+
+
+# generations running in this process, by titles key
+inflight: Dict[str, Flight] = {}
+
+
+def cancel_summary(feed_id: str) -> bool:
+    """Leaves the feed's generations, returning whether one was cancelled."""
+    cancelled = False
+    for flight in list(inflight.values()):
+        if flight.feed_id == feed_id and flight.reason is None:
+            flight.leave()
+            cancelled |= flight.reason is not None
+    return cancelled
+
+
+async def watch(mercure: Optional[HttpRequest], flight: Flight, interval: float) -> str:
+    """Returns once the flight is cancelled or Mercure has no subscribers left."""
+    while mercure is not None and interval > 0:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(flight.cancelled.wait(), interval)
+        if flight.reason is not None:
+            break
+        count = await subscribers(mercure)
+        if count is None:
+            break
+        if count == 0:
+            flight.cancel("no subscribers")
+    await flight.cancelled.wait()
+    return flight.reason
+
+
+async def generate(
+    summary: Awaitable[str],
+    mercure: Optional[HttpRequest],
+    flight: Flight,
+    budget: float,
+) -> Optional[str]:
+    """Awaits summary, returning None or the reason it was cancelled.
+
+    Cancelling the summary closes its Ollama stream, which stops the
+    generation and frees its slot with the LLM scheduler.
+    """
+    task = asyncio.ensure_future(summary)
+    watcher = asyncio.ensure_future(
+        watch(mercure, flight, get_news_summary_presence_interval())
+    )
+    try:
+        done, _ = await asyncio.wait(
+            [task, watcher], timeout=budget, return_when=asyncio.FIRST_COMPLETED
+        )
+        if task in done:
+            task.result()
+            return None
+        return watcher.result() if watcher in done else "timeout"
+    finally:
+        for t in (task, watcher):
+            t.cancel()
+        await asyncio.gather(task, watcher, return_exceptions=True)
+
+
+async def subscribe(
+    mercure: Optional[HttpRequest], flight: Flight, feed_id: str
+) -> Optional[str]:
+    flight.join(mercure is not None)
+    flight.resync = True
+    summary = await asyncio.shield(flight.done)
+    # the generation ended before the leader could resend the whole text
+    if (flight.resync or not flight.publishing) and summary is not None:
         try:
-            await send(HttpRequest(session=mercure_session), event.data["news-summary"])
-        except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError) as e:
+            await send(mercure, summary, feed_id)
+        except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError):
             logger.exception("failed send to client")
-        finally:
-            await mercure_session.close()
-        return
+    return summary
 
-    logger.debug("starting news summary...")
 
-    if not event:
-        event = await create_job_event(
+async def summarize_feed(
+    mercure: Optional[HttpRequest],
+    ollama: HttpRequest,
+    feed_id: str,
+    items: Optional[List[dict]] = None,
+    priority: int = INTERACTIVE,
+) -> Optional[str]:
+    """Returns the feed's summary, generating it unless its job already has one.
+
+    Progress is streamed to Mercure, without a mercure session the summary is
+    generated quietly. Generations queue for the LLM by `priority`.
+    """
+    feed = FeedRegistry.get(feed_id)
+    if feed is None:
+        raise ValueError(f"unknown feed {feed_id}")
+
+    try:
+        logger.debug("chat client started...")
+        await send(mercure, "Chat client started...", feed_id)
+    except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError):
+        logger.exception("failed send to client")
+        return None
+
+    stages = Stages()
+    if items is None:
+        with stages.time("feed_parse"):
+            items = await read_items(feed)
+    with stages.time("hash"):
+        key = titles_key(join_titles(items))
+
+    flight = inflight.get(key)
+    if flight is not None:
+        logger.debug("subscribing to news summary %s", key)
+        metrics.incr("news_summary.subscribed")
+        return await subscribe(mercure, flight, feed_id)
+
+    flight = inflight[key] = Flight(feed_id, interactive=mercure is not None)
+    summary = None
+    try:
+        summary = await _summarize(
+            mercure, ollama, flight, feed_id, key, items, priority, stages
+        )
+    finally:
+        del inflight[key]
+        flight.done.set_result(summary)
+    return summary
+
+
+async def wait_for_job(job: Job, interval: float, timeout: float) -> Optional[str]:
+    """Polls a job claimed elsewhere, returning its summary once it succeeds."""
+    deadline = time.monotonic() + timeout
+    while job.status == "pending" and time.monotonic() < deadline:
+        await asyncio.sleep(interval)
+        await job.arefresh_from_db(fields=["status", "data"])
+    return job.data.get("news-summary") if job.status == "success" else None
+
+
+async def _summarize(
+    mercure: Optional[HttpRequest],
+    ollama: HttpRequest,
+    flight: Flight,
+    feed_id: str,
+    key: str,
+    items: List[dict],
+    priority: int = INTERACTIVE,
+    stages: Optional[Stages] = None,
+) -> Optional[str]:
+    """Generates and publishes the summary for key, returning it when it succeeds."""
+    stages = Stages() if stages is None else stages
+    with stages.time("db_lookup"):
+        event, claimed = await claim_job_event(
             name="news_summary",
-            data={"key": key, "version": "1"},
+            data={"key": key, "version": "1", "feed_id": feed_id},
         )
+
+    if event.status == "success":
         try:
-            await send_job_created(HttpRequest(session=mercure_session), event)
+            flight.resync = False
+            await send(mercure, event.data["news-summary"], feed_id)
+        except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError) as e:
+            logger.exception("failed send to client")
+        return event.data["news-summary"]
+
+    if not claimed:
+        # another process is generating this summary, possibly quietly as
+        # the warmer does, so wait for its job and send what it stored
+        logger.debug("news summary %s is claimed by job %s", key, event.id)
+        metrics.incr("news_summary.claimed_elsewhere")
+        if mercure is None:
+            return None
+        try:
+            await send(mercure, "Summarizing the latest news...", feed_id)
+            summary = await wait_for_job(
+                event, get_news_summary_poll_interval(), get_job_claim_timeout()
+            )
+            if summary is not None:
+                flight.resync = False
+                await send(mercure, summary, feed_id)
         except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError):
             logger.exception("failed send to client")
-            await mercure_session.close()
-            return
+            return None
+        return summary
 
     try:
-        logger.debug("")
-        await send(HttpRequest(session=mercure_session), "Obtaining latest news...")
-    except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError):
-        logger.exception("failed send to client")
-        await mercure_session.close()
-        return
+        return await _generate(
+            mercure, ollama, flight, event, feed_id, items, priority, stages
+        )
+    except BaseException as e:
+        # frees the key at once, rather than leaving every request to wait
+        # for a generation that is not running until the claim goes stale
+        await Job.objects.filter(id=event.id, status="pending").aupdate(status="error")
+        if isinstance(e, (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError)):
+            logger.exception("failed send to client")
+            return None
+        raise
+
+
+async def _generate(
+    mercure: Optional[HttpRequest],
+    ollama: HttpRequest,
+    flight: Flight,
+    event: Job,
+    feed_id: str,
+    items: List[dict],
+    priority: int = INTERACTIVE,
+    stages: Optional[Stages] = None,
+) -> Optional[str]:
+    """Generates and publishes the summary for a claimed job.
+
+    The job keeps the timings of every stage, from reading the feed to the
+    latency of each publish, so a slow summary shows where it lost time.
+    """
+    stages = Stages() if stages is None else stages
+    prompt = build_prompt(
+        [item.get("title") for item in items],
+        [item.get("summary") for item in items],
+        budget=get_news_summary_prompt_tokens(),
+        excerpt_size=get_news_summary_excerpt_size(),
+    )
+    event.data["prompt"] = {
+        "tokens": prompt.tokens,
+        "titles": prompt.titles,
+        "excerpts": prompt.excerpts,
+        "dropped": prompt.dropped,
+    }
+    metrics.observe("news_summary.prompt_tokens", prompt.tokens)
+    logger.debug("starting news summary...")
+    key = event.key
+    if event.created_at == event.claimed_at:
+        await send_job_created(mercure, event)
+    else:
+        await send_job_update(mercure, event)
+    await send(mercure, "Obtaining latest news...", feed_id)
 
     status = event.status
+    parts: List[str] = []
+    published: List[str] = []
+    latencies: List[float] = []
+    append = get_news_summary_publish_mode() == "append"
+
+    async def publish_delta(delta: str) -> None:
+        # appending sends each delta once, updating resends the whole text
+        published.append(delta)
+        started = time.monotonic()
+        if append and not flight.resync:
+            await send(
+                mercure, delta, feed_id, template="news/news_summary_append.html"
+            )
+        else:
+            flight.resync = False
+            await send(mercure, "".join(published), feed_id)
+        latencies.append(time.monotonic() - started)
+        metrics.observe("news_summary.publish_latency", latencies[-1])
 
-    async with aiohttp.ClientSession(
-        trust_env=False,
-        raise_for_status=True,
-        timeout=aiohttp.ClientTimeout(total=READ_TIMEOUT),
-    ) as session:
-        summary = ""
-        try:
-            logger.debug("reading tokens...")
-            async for token in read_tokens(HttpRequest(session=session), titles):
-                summary = f"{summary}{token}"
-                await send(HttpRequest(session=mercure_session), summary)
-        except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError) as e:
-            logger.exception("failed to send summary to client")
-            status = "error"
+    try:
+        if append:
+            # replaces the status message with the paragraph deltas append to
+            await send(mercure, "", feed_id)
+        logger.debug("reading tokens...")
+        reason = await generate(
+            stream_summary(
+                read_tokens(ollama, prompt.text, priority, stages),
+                publish_delta,
+                TokenBuffer(
+                    interval=get_news_summary_flush_interval(),
+                    size=get_news_summary_flush_size(),
+                ),
+                DeltaQueue(maxsize=get_news_summary_queue_size()),
+                parts,
+            ),
+            mercure,
+            flight,
+            get_news_summary_time_budget(),
+        )
+        if reason is not None:
+            # keeps what was generated, the job is claimed again on request
+            logger.info("news summary %s cancelled: %s", key, reason)
+            metrics.incr("news_summary.cancelled")
+            event.data["cancelled"] = reason
+            status = "cancelled"
         else:
+            if flight.resync:
+                flight.resync = False
+                await send(mercure, "".join(parts), feed_id)
+            event.data.pop("cancelled", None)
             status = "success"
+    except Overloaded:
+        # leaves the job in error so the next request claims it again
+        logger.warning("news summary %s shed, the llm queue is full", key)
+        status = "error"
+        try:
+            await send(mercure, "The summarizer is busy, try again shortly.", feed_id)
+        except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError):
+            logger.exception("failed send to client")
+    except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError) as e:
+        logger.exception("failed to send summary to client")
+        status = "error"
 
     logger.debug("saving event with status %s", status)
     event.status = status
-    event.data["news-summary"] = summary
+    event.data["news-summary"] = "".join(parts)
+    event.data["stages"] = stages.stats | {
+        "publish_count": len(latencies),
+        "publish_p50": round(percentile(latencies, 50), 4),
+        "publish_p95": round(percentile(latencies, 95), 4),
+    }
+    logger.info("news summary %s stages %s", key, event.data["stages"])
     await event.asave()
 
     try:
-        await send_job_update(HttpRequest(session=mercure_session), event)
+        await send_job_update(mercure, event)
     except (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError):
         logger.exception("failed send to client")
-    finally:
-        await mercure_session.close()
+    return event.data["news-summary"] if status == "success" else None
 
 
 class Command(BaseCommand):
     help = "Start News Summary"
 
+    def add_arguments(self, parser):
+        parser.add_argument("--feed", default="hackernews", help="Feed to summarize")
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Summarize every registered feed",
+        )
+
     def handle(self, *args, **options) -> None:
-        asyncio.run(get_summary())
+        if options.get("all"):
+            asyncio.run(get_summaries())
+        else:
+            asyncio.run(get_summary(feed_id=options["feed"]))
+        metrics.log()
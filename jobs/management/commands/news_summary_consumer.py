@@ -1,42 +1,112 @@
 import asyncio
 import json
 import logging
+from typing import Optional, Set
 
 import aio_pika
 import aio_pika.abc
 from django.core.management.base import BaseCommand
 
-from scrutiny.env import get_rmq_dsn  # noqa
-from .news_summary import get_summary
+from scrutiny.env import (  # noqa
+    get_mercure_connection_limit,
+    get_news_summary_warm_interval,
+    get_metrics_log_interval,
+    get_news_summary_concurrency,
+    get_ollama_connection_limit,
+    get_rmq_dsn,
+)
+from jobs.metrics import metrics
+from .news_summary_warmer import poll
+from .news_summary import (
+    HttpRequest,
+    cancel_summary,
+    get_summaries,
+    get_summary,
+    mercure_session,
+    ollama_session,
+)
 
 logger = logging.getLogger(__name__)
 
 
-async def main(loop: asyncio.AbstractEventLoop, dsn: str) -> None:
+async def summarize(msg: dict, slots: asyncio.Semaphore, **sessions) -> None:
+    async with slots:
+        try:
+            if msg.get("action") == "batch":
+                await get_summaries(feed_ids=msg.get("feed_ids"), **sessions)
+            else:
+                await get_summary(feed_id=msg.get("feed_id", "hackernews"), **sessions)
+        except Exception:
+            logging.exception("unable to process message %s", msg)
+
+
+async def on_cancel(message: aio_pika.abc.AbstractIncomingMessage) -> None:
+    msg = json.loads(message.body.decode())
+    logger.info("cancel %s", msg)
+    cancel_summary(msg.get("feed_id", "hackernews"))
+
+
+async def main(loop: asyncio.AbstractEventLoop, dsn: str, warm: bool = False) -> None:
     logger.debug("connecting to rmq...")
+    reporter = asyncio.ensure_future(metrics.report(get_metrics_log_interval()))
     connection = await aio_pika.connect_robust(dsn, loop=loop)
-    async with connection:
+    # both pools live as long as the consumer, so summaries reuse warm
+    # keep-alive connections instead of opening new ones per message
+    mercure = mercure_session(get_mercure_connection_limit())
+    ollama = ollama_session(get_ollama_connection_limit())
+    async with connection, mercure, ollama:
         queue_name = "news-summary"
         channel: aio_pika.abc.AbstractChannel = await connection.channel()
         queue: aio_pika.abc.AbstractQueue = await channel.declare_queue(
             queue_name, auto_delete=True
         )
+        # a generation only runs in the consumer that took its message, so
+        # cancels are fanned out to every consumer and handled as they arrive
+        exchange = await channel.declare_exchange(
+            "news-summary-cancel", aio_pika.ExchangeType.FANOUT
+        )
+        cancels = await channel.declare_queue(exclusive=True)
+        await cancels.bind(exchange)
+        await cancels.consume(on_cancel, no_ack=True)
+        # summaries run concurrently so requests for the same news can share
+        # one generation, at most NEWS_SUMMARY_CONCURRENCY at a time
+        slots = asyncio.Semaphore(get_news_summary_concurrency())
+        tasks: Set[asyncio.Task] = set()
+        warmer: Optional[asyncio.Task] = None
+        if warm:
+            # warming here shares the consumer's LLM scheduler, so viewers
+            # are served ahead of it and Ollama sees a single cap
+            warmer = asyncio.ensure_future(
+                poll(HttpRequest(session=ollama), get_news_summary_warm_interval())
+            )
         async with queue.iterator() as queue_iter:
             async for message in queue_iter:
                 await message.ack()
                 msg = json.loads(message.body.decode())
-                if msg.get("action") == "start":
-                    try:
-                        await get_summary()
-                    except Exception:
-                        logging.exception("unable to process message %s", msg)
-                        continue
+                if msg.get("action") in ("start", "batch"):
+                    task = asyncio.ensure_future(
+                        summarize(msg, slots, mercure=mercure, ollama=ollama)
+                    )
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        if warmer is not None:
+            warmer.cancel()
+            await asyncio.gather(warmer, return_exceptions=True)
+    reporter.cancel()
 
 
 class Command(BaseCommand):
     help = "Start News Summary"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--warm",
+            action="store_true",
+            help="Keep news summaries warm as feeds change, see news_summary_warmer",
+        )
+
     def handle(self, *args, **options) -> None:
         loop = asyncio.get_event_loop()
-        loop.run_until_complete(main(loop, get_rmq_dsn()))
+        loop.run_until_complete(main(loop, get_rmq_dsn(), warm=options["warm"]))
         loop.close()
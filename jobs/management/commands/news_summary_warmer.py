@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from django.core.management.base import BaseCommand
+
+from jobs.metrics import metrics
+from jobs.scheduler import BACKGROUND
+from news.models import FeedRegistry  # noqa
+from scrutiny.env import (  # noqa
+    get_news_summary_batch_concurrency,
+    get_news_summary_warm_interval,
+    get_metrics_log_interval,
+    get_ollama_connection_limit,
+)
+from .news_summary import (
+    HttpRequest,
+    ollama_session,
+    join_titles,
+    read_items,
+    summarize_feed,
+    titles_key,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def warm(ollama: HttpRequest, seen: Dict[str, str], concurrency: int = 2) -> None:
+    """Generates the summary of every feed whose titles changed since the last poll.
+
+    `seen` maps feed ids to the titles key last warmed. Summaries are stored
+    on their jobs without publishing anything, so the next viewer of a feed
+    is served the finished summary.
+    """
+    feeds = FeedRegistry.feeds()
+    items = await asyncio.gather(
+        *(read_items(feed) for feed in feeds), return_exceptions=True
+    )
+    slots = asyncio.Semaphore(concurrency)
+
+    async def warm_feed(feed, feed_items) -> None:
+        if isinstance(feed_items, Exception):
+            logger.error("unable to read feed %s: %r", feed.id, feed_items)
+            return
+        key = titles_key(join_titles(feed_items))
+        if seen.get(feed.id) == key:
+            metrics.incr("news_summary.warm_unchanged")
+            return
+        async with slots:
+            try:
+                summary = await summarize_feed(
+                    None, ollama, feed.id, feed_items, BACKGROUND
+                )
+            except Exception:
+                logger.exception("unable to warm summary of %s", feed.id)
+                return
+        if summary is not None:
+            seen[feed.id] = key
+            metrics.incr("news_summary.warmed")
+
+    await asyncio.gather(
+        *(warm_feed(feed, feed_items) for feed, feed_items in zip(feeds, items))
+    )
+
+
+async def poll(
+    ollama: HttpRequest,
+    interval: float,
+    once: bool = False,
+    concurrency: Optional[int] = None,
+) -> None:
+    """Warms every feed every `interval` seconds.
+
+    Generations only queue behind interactive ones on the LLM scheduler of
+    their own process, so run this inside the consumer with
+    `news_summary_consumer --warm` rather than as its own command.
+    """
+    seen: Dict[str, str] = {}
+    while True:
+        started = time.monotonic()
+        await warm(
+            ollama,
+            seen,
+            concurrency=concurrency or get_news_summary_batch_concurrency(),
+        )
+        if once:
+            return
+        await asyncio.sleep(max(interval - (time.monotonic() - started), 0))
+
+
+async def main(interval: float, once: bool = False, concurrency: Optional[int] = None):
+    reporter = asyncio.ensure_future(metrics.report(get_metrics_log_interval()))
+    try:
+        async with ollama_session(get_ollama_connection_limit()) as session:
+            await poll(HttpRequest(session=session), interval, once, concurrency)
+    finally:
+        reporter.cancel()
+
+
+class Command(BaseCommand):
+    help = "Keep news summaries warm as feeds change"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Seconds between polls of every feed",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Poll every feed once and exit",
+        )
+
+    def handle(self, *args, **options) -> None:
+        asyncio.run(
+            main(
+                options.get("interval") or get_news_summary_warm_interval(),
+                once=options.get("once", False),
+            )
+        )
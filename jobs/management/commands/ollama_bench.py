@@ -0,0 +1,93 @@
+import asyncio
+import json
+import time
+
+from aiohttp import web
+from django.core.management.base import BaseCommand
+
+from .news_summary import HttpRequest, _read_tokens, ollama_session
+
+
+def stream_body(tokens: int) -> bytes:
+    return b"".join(
+        json.dumps(
+            {
+                "model": "orca-mini",
+                "created_at": "2024-01-01T00:00:00.000000Z",
+                "response": f" token{i}",
+                "done": i == tokens - 1,
+            }
+        ).encode()
+        + b"\n"
+        for i in range(tokens)
+    )
+
+
+def stand_in(body: bytes, chunk_size: int) -> web.Application:
+    """An /api/generate endpoint replaying body in chunk_size byte writes.
+
+    Chunk boundaries fall anywhere, splitting lines and packing several into
+    one chunk, the way a real network delivers them.
+    """
+
+    async def generate(request: web.Request) -> web.StreamResponse:
+        await request.read()
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        for start in range(0, len(body), chunk_size):
+            await resp.write(body[start : start + chunk_size])
+        await resp.write_eof()
+        return resp
+
+    app = web.Application()
+    app.router.add_post("/api/generate", generate)
+    return app
+
+
+async def bench(tokens: int, chunk_size: int, rounds: int) -> list:
+    runner = web.AppRunner(stand_in(stream_body(tokens), chunk_size))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    results = []
+    try:
+        async with ollama_session() as session:
+            for _ in range(rounds):
+                started = time.perf_counter()
+                count = 0
+                async for _ in _read_tokens(
+                    HttpRequest(session=session),
+                    base_url=f"http://{host}:{port}",
+                    json={"model": "orca-mini", "prompt": ""},
+                ):
+                    count += 1
+                results.append((count, time.perf_counter() - started))
+    finally:
+        await runner.cleanup()
+    return results
+
+
+class Command(BaseCommand):
+    help = "Benchmark reading tokens from a local stand-in Ollama server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tokens", type=int, default=100_000)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Bytes per write, lines are split across writes",
+        )
+        parser.add_argument("--rounds", type=int, default=5)
+
+    def handle(self, *args, **options) -> None:
+        results = asyncio.run(
+            bench(options["tokens"], options["chunk_size"], options["rounds"])
+        )
+        for count, duration in results:
+            self.stdout.write(
+                f"{count} tokens in {duration:0.3f}s ({count / duration:0.0f} tokens/s)"
+            )
+        count, duration = min(results, key=lambda result: result[1])
+        self.stdout.write(self.style.SUCCESS(f"best {count / duration:0.0f} tokens/s"))
@@ -0,0 +1,1110 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import re
+from urllib import parse
+from http import HTTPStatus
+from unittest import mock
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.contrib.auth.models import User
+from django.template.loader import render_to_string
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from social_django.models import UserSocialAuth
+
+from jobs.bulk import BulkWriter
+from jobs.index import ArticleIndex
+from jobs.metrics import Metrics
+from jobs.models import Job
+from jobs.pocket import PocketClient, PocketError, RetryBudget
+from jobs.prompt import build_prompt
+from jobs.scheduler import BACKGROUND, INTERACTIVE, Overloaded, Scheduler
+from jobs.stream import iter_lines, iter_object
+from library.models import Article, Tag
+from news.models import Feed, FeedRegistry
+from . import library_sync
+from .feed_poller import FeedPoller, FeedState
+from .library_sync_consumer import SyncScheduler
+from . import news_summary
+from .news_summary_warmer import warm
+from .news_summary import (
+    DeltaQueue,
+    HttpRequest,
+    TokenBuffer,
+    cancel_summary,
+    get_summaries,
+    get_summary,
+    mercure_session,
+    ollama_session,
+    stream_summary,
+)
+from .library_sync import (
+    _article,
+    _item,
+    create_articles,
+    diff_articles,
+    get_pocket_pages,
+    main,
+    read_articles,
+    sync_mode,
+    use_copy,
+)
+
+
+def pocket_item(item_id: int, status: str = "0") -> dict:
+    return {
+        "item_id": str(item_id),
+        "status": status,
+        "resolved_title": f"title {item_id}",
+        "excerpt": f"excerpt {item_id}",
+        "listen_duration_estimate": 10,
+        "authors": {},
+        "tags": {"python": {"item_id": str(item_id), "tag": "python"}},
+    }
+
+
+class PocketServer:
+    """Stand-in for the Pocket /v3/get endpoint backed by an in-memory library."""
+
+    def __init__(self, size: int, delay: float = 0.01, since: int = 1700000000):
+        self.library = [pocket_item(i) for i in range(1, size + 1)]
+        # per access token libraries, the default library serves everyone else
+        self.libraries = {}
+        # per access token error statuses, returned before any page is served
+        self.failures = {}
+        self.since = since
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.app = web.Application()
+        self.app.router.add_post("/v3/get", self.get)
+
+    async def get(self, request: web.Request) -> web.Response:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            body = await request.json()
+            self.requests.append(body)
+            await asyncio.sleep(self.delay)
+            failures = self.failures.get(body.get("access_token"))
+            if failures:
+                return web.Response(status=failures.pop(0))
+            offset = body.get("offset", 0)
+            library = self.libraries.get(body.get("access_token"), self.library)
+            count = body.get("count", len(library))
+            page = library[offset : offset + count]
+            return web.json_response(
+                {
+                    "list": {item["item_id"]: item for item in page} if page else [],
+                    "since": self.since,
+                }
+            )
+        finally:
+            self.in_flight -= 1
+
+
+class TestGetPocketPages(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = User.objects.create_user("foo", "myemail@test.com", "pass")
+        self.usr = UserSocialAuth.objects.create(
+            user=self.user,
+            provider="pocket",
+            uid="foo",
+            extra_data={"access_token": "token"},
+        )
+
+    async def fetch(self, pocket: PocketServer, page_size: int, concurrency: int, **kw):
+        async with TestServer(pocket.app) as server:
+            base_url = str(server.make_url("")).rstrip("/")
+            async with PocketClient("key", base_url=base_url, rate=1000) as client:
+                return [
+                    page
+                    async for page in get_pocket_pages(
+                        client,
+                        RetryBudget(0),
+                        self.usr,
+                        page_size=page_size,
+                        concurrency=concurrency,
+                        **kw,
+                    )
+                ]
+
+    async def test_pages(self) -> None:
+        pocket = PocketServer(size=95)
+        pages = await self.fetch(pocket, page_size=10, concurrency=3)
+        ids = sorted(item.id for page in pages for item in page.items)
+        self.assertEqual(ids, list(range(1, 96)))
+        self.assertEqual(len(pages), 10)
+        self.assertLessEqual(pocket.max_in_flight, 3)
+        self.assertTrue(all(r["count"] == 10 for r in pocket.requests))
+        self.assertTrue(all(r["access_token"] == "token" for r in pocket.requests))
+        self.assertTrue(all(r["consumer_key"] == "key" for r in pocket.requests))
+
+    async def test_pages_exact_multiple(self) -> None:
+        pocket = PocketServer(size=20)
+        pages = await self.fetch(pocket, page_size=10, concurrency=1)
+        self.assertEqual([len(page.items) for page in pages], [10, 10])
+        self.assertEqual([r["offset"] for r in pocket.requests], [0, 10, 20])
+
+    async def test_empty_library(self) -> None:
+        pocket = PocketServer(size=0)
+        pages = await self.fetch(pocket, page_size=10, concurrency=2)
+        self.assertEqual(pages, [])
+
+    async def test_delta(self) -> None:
+        pocket = PocketServer(size=3, since=1700000500)
+        pocket.library[1]["status"] = "2"
+        pocket.library[2] = {"item_id": "3", "status": "1"}
+        pages = await self.fetch(pocket, page_size=10, concurrency=1, since=1700000000)
+        self.assertEqual([item.id for item in pages[0].items], [1])
+        self.assertEqual(pages[0].removed, [2, 3])
+        self.assertEqual(pages[0].since, 1700000500)
+        self.assertEqual(pocket.requests[0]["since"], 1700000000)
+        self.assertEqual(pocket.requests[0]["state"], "all")
+
+    async def test_failed_page(self) -> None:
+        pocket = PocketServer(size=50)
+        pocket.failures = {"token": [HTTPStatus.UNAUTHORIZED]}
+        with self.assertRaises(PocketError):
+            await self.fetch(pocket, page_size=10, concurrency=1)
+
+
+class TestPocketClient(TestCase):
+    async def request(self, pocket: PocketServer, budget: RetryBudget, **kw):
+        self.metrics = Metrics()
+        async with TestServer(pocket.app) as server:
+            base_url = str(server.make_url("")).rstrip("/")
+            async with PocketClient(
+                "key", base_url=base_url, backoff=0.0, metrics=self.metrics, **kw
+            ) as client:
+                return await client.get(budget, "token", offset=0, count=10)
+
+    async def test_retry(self) -> None:
+        pocket = PocketServer(size=5)
+        pocket.failures = {"token": [HTTPStatus.SERVICE_UNAVAILABLE] * 2}
+        budget = RetryBudget(5)
+        data = await self.request(pocket, budget)
+        self.assertEqual(len(data["list"]), 5)
+        self.assertEqual(budget.spent, 2)
+        self.assertEqual(self.metrics.counters["pocket.requests"], 3)
+        self.assertEqual(self.metrics.counters["pocket.retries"], 2)
+        self.assertEqual(len(self.metrics.timings["pocket.latency"]), 1)
+
+    async def test_retry_budget(self) -> None:
+        pocket = PocketServer(size=5)
+        pocket.failures = {"token": [HTTPStatus.TOO_MANY_REQUESTS] * 3}
+        budget = RetryBudget(1)
+        with self.assertRaises(PocketError):
+            await self.request(pocket, budget)
+        self.assertEqual(len(pocket.requests), 2)
+        self.assertEqual(self.metrics.counters["pocket.failures"], 1)
+
+    async def test_max_retries(self) -> None:
+        pocket = PocketServer(size=5)
+        pocket.failures = {"token": [HTTPStatus.BAD_GATEWAY] * 3}
+        with self.assertRaises(PocketError):
+            await self.request(pocket, RetryBudget(10), max_retries=1)
+        self.assertEqual(len(pocket.requests), 2)
+
+    async def test_no_retry(self) -> None:
+        pocket = PocketServer(size=5)
+        pocket.failures = {"token": [HTTPStatus.FORBIDDEN]}
+        budget = RetryBudget(5)
+        with self.assertRaises(PocketError):
+            await self.request(pocket, budget)
+        self.assertEqual(budget.spent, 0)
+
+    async def test_rate_limit(self) -> None:
+        pocket = PocketServer(size=5, delay=0)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with TestServer(pocket.app) as server:
+            base_url = str(server.make_url("")).rstrip("/")
+            async with PocketClient("key", base_url=base_url, rate=20, burst=1) as c:
+                await asyncio.gather(
+                    *(c.get(RetryBudget(0), "token") for _ in range(5))
+                )
+        self.assertGreaterEqual(loop.time() - started, 0.19)
+
+
+class TestSyncMode(TestCase):
+    interval = 100.0
+
+    def job(self, **data) -> Job:
+        return Job(name="library_sync", status="success", data=data)
+
+    def test_first_sync(self) -> None:
+        self.assertEqual(sync_mode(None, False, 1000.0, self.interval), "full")
+
+    def test_on_demand(self) -> None:
+        last = self.job(since=990, full_sync_at=990.0)
+        self.assertEqual(sync_mode(last, True, 1000.0, self.interval), "full")
+
+    def test_missing_cursor(self) -> None:
+        last = self.job(since=None, full_sync_at=990.0)
+        self.assertEqual(sync_mode(last, False, 1000.0, self.interval), "full")
+
+    def test_interval_elapsed(self) -> None:
+        last = self.job(since=990, full_sync_at=800.0)
+        self.assertEqual(sync_mode(last, False, 1000.0, self.interval), "full")
+
+    def test_delta(self) -> None:
+        last = self.job(since=990, full_sync_at=950.0)
+        self.assertEqual(sync_mode(last, False, 1000.0, self.interval), "delta")
+
+
+class TestDiffArticles(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = User.objects.create_user("foo", "myemail@test.com", "pass")
+        self.usr = UserSocialAuth.objects.create(
+            user=self.user, provider="pocket", uid="foo"
+        )
+
+    def test_buckets(self) -> None:
+        items = [_item(pocket_item(i)) for i in range(1, 4)]
+        existing = ArticleIndex()
+        existing.append(2, items[1].content_hash)
+        existing.append(3, "0123456789abcdef")
+        existing.append(4, "fedcba9876543210")
+        diff = diff_articles(items, existing)
+        self.assertEqual([item.id for item in diff.insert], [1])
+        self.assertEqual([item.id for item in diff.update], [3])
+        self.assertEqual(diff.unchanged, 1)
+
+    def test_hash_tracks_content(self) -> None:
+        item = pocket_item(1)
+        before = _item(item).content_hash
+        item["tags"]["rust"] = {"item_id": "1", "tag": "rust"}
+        self.assertNotEqual(before, _item(item).content_hash)
+
+
+def sha(value) -> str:
+    return hashlib.sha256(str(value).encode()).hexdigest()
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+class TestIterObject(TestCase):
+    async def decode(self, data: bytes, size: int = 7) -> list:
+        return [pair async for pair in iter_object(chunked(data, size), "list")]
+
+    async def test_members(self) -> None:
+        body = {
+            "status": 1,
+            "list": {str(i): pocket_item(i) for i in range(1, 4)},
+            "since": 1700000000,
+        }
+        for size in (1, 7, 4096):
+            pairs = await self.decode(json.dumps(body, indent=1).encode(), size)
+            self.assertEqual(
+                pairs,
+                [("status", 1)]
+                + [("list", item) for item in body["list"].values()]
+                + [("since", 1700000000)],
+            )
+
+    async def test_empty_list(self) -> None:
+        pairs = await self.decode(b'{"list": [], "since": 12345}')
+        self.assertEqual(pairs, [("since", 12345)])
+
+    async def test_multibyte(self) -> None:
+        body = {"list": {"1": {"title": "caf\u00e9 \u2603"}}}
+        # one byte chunks split every multibyte character
+        pairs = await self.decode(json.dumps(body, ensure_ascii=False).encode(), 1)
+        self.assertEqual(pairs, [("list", {"title": "caf\u00e9 \u2603"})])
+
+    async def test_truncated(self) -> None:
+        with self.assertRaises(ValueError):
+            await self.decode(b'{"list": {"1": {"item_id": "1"}')
+
+
+class TestIterLines(TestCase):
+    async def frame(self, *chunks: bytes) -> list:
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+
+        return [line async for line in iter_lines(stream())]
+
+    async def test_split_and_merged(self) -> None:
+        lines = await self.frame(b'{"a": 1}\n{"b"', b": 2}\n", b'{"c": 3}\n{"d": 4}')
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [{"a": 1}, {"b": 2}, {"c": 3}, {"d": 4}],
+        )
+
+    async def test_blank_lines(self) -> None:
+        self.assertEqual(
+            await self.frame(b"\n", b"a\r\n\n", b"", b"b\n"), [b"a\r", b"b"]
+        )
+
+
+class TestArticleIndex(TestCase):
+    def test_lookup(self) -> None:
+        index = ArticleIndex()
+        for article_id in (3, 10, 42):
+            index.append(article_id, sha(article_id))
+        self.assertEqual(len(index), 3)
+        self.assertIn(10, index)
+        self.assertNotIn(11, index)
+        self.assertTrue(index.matches(42, sha(42)))
+        self.assertFalse(index.matches(42, sha(43)))
+        self.assertIsNone(index.matches(7, sha(7)))
+
+    def test_append_order(self) -> None:
+        index = ArticleIndex()
+        index.append(5, "")
+        with self.assertRaises(ValueError):
+            index.append(5, "")
+
+    def test_add(self) -> None:
+        index = ArticleIndex()
+        for article_id in (30, 10, 20, 10):
+            index.add(article_id, sha(article_id))
+        self.assertEqual(list(index), [10, 20, 30])
+        self.assertTrue(index.matches(20, sha(20)))
+
+
+class TestBuildPrompt(TestCase):
+    def test_normalize(self) -> None:
+        prompt = build_prompt(
+            ["Rust  &amp; Go", "rust & go", "<b>Zig</b>\n1.0", "", None, "Odin"]
+        )
+        self.assertIn("- Rust & Go\n- Zig 1.0\n- Odin", prompt.text)
+        self.assertEqual((prompt.titles, prompt.dropped), (3, 0))
+
+    def test_budget(self) -> None:
+        titles = [f"title number {i}" for i in range(100)]
+        prompt = build_prompt(titles, budget=100)
+        self.assertLessEqual(prompt.tokens, 100)
+        self.assertIn("- title number 0\n", prompt.text)
+        self.assertGreater(prompt.dropped, 0)
+        self.assertEqual(prompt.titles + prompt.dropped, 100)
+
+    def test_excerpts(self) -> None:
+        titles = ["Rust", "Go", "Zig"]
+        excerpts = ["<p>a systems language " * 20 + "</p>", "Go", None]
+        prompt = build_prompt(titles, excerpts, budget=512, excerpt_size=40)
+        # an excerpt that only repeats its title adds nothing
+        self.assertEqual(prompt.excerpts, 1)
+        self.assertIn("- Rust: a systems language a systems language a...", prompt.text)
+        self.assertEqual(build_prompt(titles, excerpts, excerpt_size=0).excerpts, 0)
+        # titles take the budget first, excerpts only fill what is left
+        prompt = build_prompt(titles, excerpts, budget=50, excerpt_size=40)
+        self.assertEqual((prompt.titles, prompt.excerpts), (3, 0))
+
+
+class TestUseCopy(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.index = ArticleIndex()
+        self.index.append(1, "")
+
+    def test_postgres_cold_import(self) -> None:
+        self.assertTrue(use_copy(False, "full", ArticleIndex(), "postgresql"))
+
+    def test_postgres_requested(self) -> None:
+        self.assertTrue(use_copy(True, "delta", self.index, "postgresql"))
+
+    def test_postgres_existing_library(self) -> None:
+        self.assertFalse(use_copy(False, "full", self.index, "postgresql"))
+
+    def test_fallback(self) -> None:
+        self.assertFalse(use_copy(True, "full", ArticleIndex(), "sqlite"))
+
+
+class TestBulkWriter(TransactionTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = User.objects.create_user("foo", "myemail@test.com", "pass")
+        self.usr = UserSocialAuth.objects.create(
+            user=self.user, provider="pocket", uid="foo"
+        )
+
+    def articles(self, ids) -> list:
+        return [_article(_item(pocket_item(i)), self.usr) for i in ids]
+
+    async def test_upsert(self) -> None:
+        item = pocket_item(1)
+        async with BulkWriter() as writer:
+            await create_articles(writer, [_article(_item(item), self.usr)])
+        item["resolved_title"] = "updated"
+        updated = _article(_item(item), self.usr)
+        async with BulkWriter() as writer:
+            await create_articles(writer, [updated])
+        article = await Article.objects.aget(item_id=1)
+        self.assertEqual(article.resolved_title, "updated")
+        index = await read_articles(self.usr)
+        self.assertEqual(list(index), [1])
+        self.assertTrue(index.matches(1, updated.content_hash))
+
+    async def test_commit(self) -> None:
+        async with BulkWriter(batch_size=10, max_pending=2) as writer:
+            await writer.write(Article, self.articles(range(1, 96)))
+        self.assertEqual(await Article.objects.acount(), 95)
+        self.assertEqual(writer.rows, 95)
+        self.assertGreater(writer.rows_per_second, 0)
+
+    async def test_rollback(self) -> None:
+        with self.assertRaises(RuntimeError):
+            async with BulkWriter(batch_size=10) as writer:
+                await writer.write(Article, self.articles(range(1, 51)))
+                await writer.flush()
+                raise RuntimeError("sync failed")
+        self.assertEqual(await Article.objects.acount(), 0)
+
+    async def test_adaptive_batch_size(self) -> None:
+        writer = BulkWriter(batch_size=10, max_batch_size=40, target_duration=1.0)
+        writer._adapt(10, 0.01)
+        writer._adapt(20, 0.01)
+        writer._adapt(40, 0.01)
+        self.assertEqual(writer.batch_size, 40)
+        writer._adapt(40, 2.0)
+        self.assertEqual(writer.batch_size, 20)
+        writer._adapt(5, 2.0)
+        self.assertEqual(writer.batch_size, 20)
+
+
+@override_settings(POCKET_RATE_LIMIT=1000.0)
+class TestMain(TransactionTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.users = {}
+        for name in ("foo", "bar", "baz"):
+            user = User.objects.create_user(name, f"{name}@test.com", "pass")
+            UserSocialAuth.objects.create(
+                user=user,
+                provider="pocket",
+                uid=name,
+                extra_data={"access_token": name},
+            )
+            self.users[name] = user
+
+    async def sync(self, pocket: PocketServer, **kwargs) -> None:
+        async with TestServer(pocket.app) as server:
+            base_url = str(server.make_url("")).rstrip("/")
+            with mock.patch.object(
+                library_sync,
+                "PocketClient",
+                functools.partial(PocketClient, base_url=base_url, backoff=0.0),
+            ):
+                # sqlite only allows one writer, so syncs can not overlap here
+                await main(pool_size=1, **kwargs)
+
+    async def test_sync_users(self) -> None:
+        pocket = PocketServer(size=0)
+        pocket.libraries = {
+            "foo": [pocket_item(i) for i in range(1, 26)],
+            "bar": [pocket_item(i) for i in range(101, 111)],
+            "baz": [{"item_id": "broken", "status": "0"}],
+        }
+        await self.sync(pocket, full=True)
+        foo, bar = self.users["foo"], self.users["bar"]
+        self.assertEqual(await Article.objects.filter(user=foo).acount(), 25)
+        self.assertEqual(await Article.objects.filter(user=bar).acount(), 10)
+        jobs = {
+            job.data["user_id"]: job
+            async for job in Job.objects.filter(name="library_sync")
+        }
+        self.assertEqual(jobs[foo.id].status, "success")
+        self.assertEqual(jobs[foo.id].data["results"]["inserted"], 25)
+        self.assertEqual(jobs[bar.id].status, "success")
+        self.assertEqual(jobs[self.users["baz"].id].status, "error")
+
+    async def test_shared_items(self) -> None:
+        pocket = PocketServer(size=0)
+        library = [pocket_item(i) for i in range(1, 4)]
+        pocket.libraries = {"foo": library, "bar": library}
+        foo, bar = self.users["foo"], self.users["bar"]
+        for _ in range(3):
+            await self.sync(pocket, full=True, user_ids=[foo.id, bar.id])
+        # both users own a copy of every item, syncing again changes nothing
+        for user in (foo, bar):
+            self.assertEqual(await Article.objects.filter(user=user).acount(), 3)
+            self.assertEqual(await Tag.objects.filter(user=user).acount(), 3)
+            job = await Job.objects.filter(data__user_id=user.id).afirst()
+            self.assertEqual(job.data["results"]["inserted"], 0)
+            self.assertEqual(job.data["results"]["unchanged"], 3)
+
+    async def test_failed_fetch_keeps_library(self) -> None:
+        pocket = PocketServer(size=0)
+        pocket.libraries = {"foo": [pocket_item(i) for i in range(1, 6)]}
+        await self.sync(pocket, full=True)
+        pocket.failures = {"foo": [HTTPStatus.SERVICE_UNAVAILABLE] * 20}
+        await self.sync(pocket, full=True)
+        foo = self.users["foo"]
+        self.assertEqual(await Article.objects.filter(user=foo).acount(), 5)
+        job = await Job.objects.filter(data__user_id=foo.id).afirst()
+        self.assertEqual(job.status, "error")
+        self.assertGreater(job.data["retries"], 0)
+
+    async def test_shared_client(self) -> None:
+        pocket = PocketServer(size=3)
+        async with TestServer(pocket.app) as server:
+            base_url = str(server.make_url("")).rstrip("/")
+            client = PocketClient("key", base_url=base_url, rate=1000.0)
+            async with client:
+                with mock.patch.object(library_sync, "PocketClient") as new_client:
+                    await main(pool_size=1, client=client)
+                    new_client.assert_not_called()
+        self.assertEqual(await Article.objects.acount(), 9)
+
+    async def test_sync_selected_users(self) -> None:
+        pocket = PocketServer(size=3)
+        await self.sync(pocket, user_ids=[self.users["bar"].id])
+        self.assertEqual({r["access_token"] for r in pocket.requests}, {"bar"})
+        self.assertEqual(await Article.objects.acount(), 3)
+
+
+class TestSyncScheduler(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.runs = []
+        self.release = asyncio.Event()
+        self.metrics = Metrics()
+
+    async def sync(self, user_id, full) -> None:
+        self.runs.append((user_id, full))
+        await self.release.wait()
+
+    def scheduler(self, **kwargs) -> SyncScheduler:
+        return SyncScheduler(self.sync, metrics=self.metrics, **kwargs)
+
+    async def test_coalesce(self) -> None:
+        scheduler = self.scheduler(min_interval=0, concurrency=1)
+        self.assertTrue(scheduler.trigger(1))
+        await asyncio.sleep(0)
+        # user 1 is running, the first trigger queues a follow up and the
+        # rest merge into it
+        self.assertTrue(scheduler.trigger(1))
+        self.assertFalse(scheduler.trigger(1, full=True))
+        self.assertFalse(scheduler.trigger(1))
+        self.assertTrue(scheduler.trigger(2))
+        self.release.set()
+        await scheduler.join()
+        self.assertEqual(self.runs, [(1, False), (2, False), (1, True)])
+        self.assertEqual(self.metrics.counters["library_sync.coalesced"], 2)
+        self.assertEqual(self.metrics.counters["library_sync.runs"], 3)
+
+    async def test_follow_up(self) -> None:
+        scheduler = self.scheduler(min_interval=300, concurrency=1)
+        self.assertTrue(scheduler.trigger(1))
+        await asyncio.sleep(0)
+        # the running sync may miss what this trigger is about
+        self.assertTrue(scheduler.trigger(1))
+        self.release.set()
+        await scheduler.join()
+        self.assertEqual(self.runs, [(1, False), (1, False)])
+        self.assertFalse(scheduler.trigger(1))
+
+    async def test_min_interval(self) -> None:
+        self.release.set()
+        scheduler = self.scheduler(min_interval=60)
+        scheduler.trigger(1)
+        await scheduler.join()
+        self.assertFalse(scheduler.trigger(1))
+        self.assertTrue(scheduler.trigger(1, full=True))
+        await scheduler.join()
+        self.assertEqual(self.runs, [(1, False), (1, True)])
+        self.assertEqual(self.metrics.counters["library_sync.skipped"], 1)
+
+    async def test_failed_sync(self) -> None:
+        scheduler = SyncScheduler(mock.AsyncMock(side_effect=RuntimeError), 0)
+        scheduler.trigger(1)
+        await scheduler.join()
+        self.assertTrue(scheduler.trigger(1))
+        await scheduler.join()
+
+
+class TestScheduler(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.metrics = Metrics()
+
+    async def test_priority(self) -> None:
+        scheduler = Scheduler("llm", concurrency=1, metrics=self.metrics)
+        order = []
+
+        async def call(name: str, priority: int) -> None:
+            async with scheduler.slot(priority):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await scheduler.acquire()
+        tasks = [
+            asyncio.ensure_future(call("warm", BACKGROUND)),
+            asyncio.ensure_future(call("batch", BACKGROUND)),
+            asyncio.ensure_future(call("user", INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        self.assertEqual(self.metrics.gauges["llm.queued"], 3)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        # interactive work overtakes queued background work
+        self.assertEqual(order, ["user", "warm", "batch"])
+        self.assertEqual(scheduler.active, 0)
+
+    async def test_shed(self) -> None:
+        scheduler = Scheduler("llm", max_wait=0.01, metrics=self.metrics)
+        await scheduler.acquire()
+        background = asyncio.ensure_future(scheduler.acquire(BACKGROUND))
+        with self.assertRaises(Overloaded):
+            await scheduler.acquire(INTERACTIVE)
+        self.assertEqual(self.metrics.counters["llm.shed"], 1)
+        # background work outwaits max_wait and gets the slot in the end
+        self.assertFalse(background.done())
+        scheduler.release()
+        await background
+        scheduler.release()
+        self.assertEqual((scheduler.active, scheduler.waiters), (0, []))
+
+    async def test_cancel(self) -> None:
+        scheduler = Scheduler("llm", metrics=self.metrics)
+        await scheduler.acquire()
+        task = asyncio.ensure_future(scheduler.acquire())
+        await asyncio.sleep(0)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        scheduler.release()
+        # the cancelled waiter is not handed the slot
+        self.assertEqual(scheduler.active, 0)
+        await scheduler.acquire()
+        self.assertEqual(scheduler.active, 1)
+
+
+class TestMetrics(TestCase):
+    async def test_report(self) -> None:
+        metrics = Metrics()
+        metrics.incr("news_summary.publishes")
+        with self.assertLogs("jobs.metrics") as logs:
+            reporter = asyncio.ensure_future(metrics.report(0.01))
+            await asyncio.sleep(0.05)
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+        # a snapshot every interval and a last one on shutdown
+        self.assertGreater(len(logs.records), 2)
+        self.assertIn("news_summary.publishes", logs.output[-1])
+
+
+class TestTokenBuffer(TestCase):
+    def test_size_window(self) -> None:
+        buffer = TokenBuffer(interval=60, size=5)
+        self.assertIsNone(buffer.add("ab"))
+        self.assertEqual(buffer.add("cde"), "abcde")
+        self.assertIsNone(buffer.add("f"))
+        self.assertEqual(buffer.take(), "f")
+        self.assertEqual(buffer.take(), "")
+
+    def test_time_window(self) -> None:
+        buffer = TokenBuffer(interval=60, size=1024)
+        self.assertIsNone(buffer.add("a"))
+        buffer.taken_at -= 60
+        self.assertEqual(buffer.add("b"), "ab")
+
+    def test_append_template(self) -> None:
+        msg = render_to_string(
+            "news/news_summary_append.html", {"summary": "a <b>", "feed_id": "nature"}
+        )
+        self.assertIn('action="append" target="news-summary-nature-text"', msg)
+        self.assertIn("a &lt;b&gt;", msg)
+
+
+async def tokens(*values, delay: float = 0.0):
+    for value in values:
+        await asyncio.sleep(delay)
+        yield value
+
+
+class TestStreamSummary(TestCase):
+    async def test_slow_publisher(self) -> None:
+        published = []
+        release = asyncio.Event()
+
+        async def publish(delta: str) -> None:
+            await release.wait()
+            published.append(delta)
+
+        queue = DeltaQueue(maxsize=2)
+        task = asyncio.ensure_future(
+            stream_summary(
+                tokens(*"abcdef"), publish, TokenBuffer(interval=60, size=1), queue
+            )
+        )
+        # the reader finishes while the first publish is still blocked
+        while not queue.closed:
+            await asyncio.sleep(0)
+        self.assertEqual(len(queue.items), 2)
+        release.set()
+        self.assertEqual(await task, "abcdef")
+        self.assertEqual("".join(published), "abcdef")
+        self.assertEqual(published, ["a", "b", "cdef"])
+
+    async def test_publish_failure(self) -> None:
+        parts = []
+        publish = mock.AsyncMock(side_effect=aiohttp.ClientConnectionError)
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            await stream_summary(
+                tokens("a", "b", delay=0.01),
+                publish,
+                TokenBuffer(interval=60, size=1),
+                DeltaQueue(),
+                parts,
+            )
+        self.assertEqual(parts, ["a"])
+
+
+class SummaryServer:
+    """Stand-in for the Mercure hub and the Ollama generate endpoint."""
+
+    def __init__(
+        self,
+        tokens=("news ", "of ", "the ", "day"),
+        delay: float = 0.0,
+        subscribers=None,
+        failures: int = 0,
+    ):
+        self.tokens = tokens
+        self.failures = failures
+        self.delay = delay
+        self.subscribers = subscribers
+        self.published = []
+        self.prompts = []
+        self.generated = 0
+        self.streamed = 0
+        self.streaming = asyncio.Event()
+        self.connections = set()
+        self.app = web.Application()
+        self.app.router.add_post("/mercure", self.publish)
+        self.app.router.add_get("/mercure/subscriptions/{topic}", self.subscriptions)
+        self.app.router.add_post("/api/generate", self.generate)
+
+    async def publish(self, request: web.Request) -> web.Response:
+        self.connections.add(request.transport)
+        self.published.append(parse.parse_qs(await request.text()))
+        return web.Response(text="urn:uuid:1")
+
+    async def generate(self, request: web.Request) -> web.StreamResponse:
+        self.connections.add(request.transport)
+        self.generated += 1
+        self.prompts.append((await request.json())["prompt"])
+        if self.failures:
+            self.failures -= 1
+            raise web.HTTPInternalServerError()
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        for i, token in enumerate(self.tokens):
+            await asyncio.sleep(self.delay)
+            done = i == len(self.tokens) - 1
+            line = {"model": "orca-mini", "response": token, "done": done}
+            await resp.write(json.dumps(line).encode() + b"\n")
+            self.streamed += 1
+            if self.streamed == 3:
+                self.streaming.set()
+        await resp.write_eof()
+        return resp
+
+    async def subscriptions(self, request: web.Request) -> web.Response:
+        if self.subscribers is None:
+            raise web.HTTPNotFound()
+        return web.json_response({"subscriptions": [{}] * self.subscribers})
+
+    def targets(self) -> list:
+        return [msg["target"][0] for msg in self.published]
+
+    def rendered(self, feed_id: str = "hackernews") -> str:
+        """The summary a subscriber sees after applying every update in order."""
+        text = ""
+        for msg in self.published:
+            data = msg["data"][0] if "data" in msg else ""
+            if f'target="news-summary-{feed_id}-text"' in data:
+                text += re.search(r"<template>(.*)</template>", data, re.S).group(1)
+            elif f'action="update" target="news-summary-{feed_id}"' in data:
+                text = re.search(r"<p[^>]*>(.*)</p>", data, re.S).group(1)
+        return text
+
+
+class TestGetSummary(TestCase):
+    @contextlib.asynccontextmanager
+    async def sessions(self, server: SummaryServer):
+        async with TestServer(server.app) as http:
+            base_url = str(http.make_url("")).rstrip("/")
+            with override_settings(
+                JWT_PUBLISH_TOKEN="token",
+                MERCURE_SVC_URL=f"{base_url}/mercure",
+                OLLAMA_SVC_URL=base_url,
+            ), mock.patch.object(news_summary, "parse_feed", side_effect=self.parse):
+                async with mercure_session(1) as mercure, ollama_session(1) as ollama:
+                    yield {"mercure": mercure, "ollama": ollama}
+
+    def parse(self, context: dict, feed) -> dict:
+        return context | {"items": [{"title": f"{feed.id} {i}"} for i in range(3)]}
+
+    async def summarize(
+        self, server: SummaryServer, times: int = 1, concurrent: int = 1
+    ) -> None:
+        async with self.sessions(server) as sessions:
+            for _ in range(times):
+                await asyncio.gather(
+                    *(get_summary(**sessions) for _ in range(concurrent))
+                )
+
+    async def test_summary(self) -> None:
+        server = SummaryServer()
+        await self.summarize(server)
+        job = await Job.objects.aget(name="news_summary")
+        self.assertEqual(job.status, "success")
+        self.assertEqual(job.data["news-summary"], "news of the day")
+        self.assertIn("jobs-table", server.targets())
+        self.assertEqual(server.targets()[-1], f"job-{job.id}")
+        self.assertIn("- hackernews 2", server.prompts[0])
+        self.assertEqual(job.data["prompt"]["titles"], 3)
+        stages = job.data["stages"]
+        for stage in ("feed_parse", "hash", "db_lookup", "time_to_first_token"):
+            self.assertGreaterEqual(stages[stage], 0)
+        self.assertEqual(stages["tokens"], 4)
+        self.assertGreater(stages["tokens_per_second"], 0)
+        self.assertGreater(stages["publish_count"], 0)
+        self.assertGreaterEqual(stages["publish_p95"], stages["publish_p50"])
+
+    async def test_shared_sessions(self) -> None:
+        server = SummaryServer()
+        await self.summarize(server, times=2)
+        # the second summary is served from the job, over the same connections
+        self.assertEqual(server.generated, 1)
+        self.assertEqual(len(server.connections), 2)
+        self.assertIn("news of the day", server.published[-1]["data"][0])
+
+    async def test_single_flight(self) -> None:
+        server = SummaryServer(delay=0.02)
+        await self.summarize(server, concurrent=3)
+        self.assertEqual(server.generated, 1)
+        self.assertEqual(await Job.objects.filter(name="news_summary").acount(), 1)
+        # late subscribers reset the page, the leader then resends it whole
+        self.assertEqual(server.rendered(), "news of the day")
+        self.assertEqual(news_summary.inflight, {})
+
+    async def test_batch(self) -> None:
+        server = SummaryServer()
+        feeds = ["hackernews", "lobsters", "nature"]
+        async with self.sessions(server) as sessions:
+            await get_summaries(feed_ids=feeds, concurrency=2, **sessions)
+            await get_summary(feed_id="lobsters", **sessions)
+        # one generation per feed, the later request is served from its job
+        self.assertEqual(server.generated, 3)
+        jobs = [job async for job in Job.objects.filter(name="news_summary")]
+        self.assertEqual(sorted(job.data["feed_id"] for job in jobs), feeds)
+        self.assertEqual(len({job.key for job in jobs}), 3)
+        for feed_id in feeds:
+            self.assertEqual(server.rendered(feed_id), "news of the day")
+
+    async def test_warm(self) -> None:
+        server = SummaryServer()
+        feeds = len(FeedRegistry.feeds())
+        seen = {}
+        async with self.sessions(server) as sessions:
+            ollama = HttpRequest(session=sessions["ollama"])
+            await warm(ollama, seen, concurrency=3)
+            self.assertEqual(server.generated, feeds)
+            self.assertEqual(server.published, [])
+            await warm(ollama, seen)
+            # a restarted warmer finds the summaries on their jobs
+            await warm(ollama, {})
+            await get_summary(feed_id="nature", **sessions)
+        self.assertEqual(server.generated, feeds)
+        self.assertEqual(len(seen), feeds)
+        self.assertEqual(server.rendered("nature"), "news of the day")
+
+    @override_settings(NEWS_SUMMARY_POLL_INTERVAL=0.01)
+    async def test_claimed_elsewhere(self) -> None:
+        server = SummaryServer()
+        titles = "; ".join(f"hackernews {i}" for i in range(3))
+        key = news_summary.titles_key(titles)
+        job, _ = await Job.objects.aclaim(
+            "news_summary", key, "1", {"key": key}, stale_after=600
+        )
+
+        async def finish() -> None:
+            await asyncio.sleep(0.05)
+            job.status = "success"
+            job.data["news-summary"] = "news from elsewhere"
+            await job.asave()
+
+        # another process, such as the warmer, generates without publishing
+        await asyncio.gather(self.summarize(server), finish())
+        self.assertEqual(server.generated, 0)
+        self.assertEqual(server.rendered(), "news from elsewhere")
+
+    async def test_subscribe_to_quiet_flight(self) -> None:
+        server = SummaryServer(delay=0.02)
+
+        async def request(sessions) -> None:
+            await asyncio.sleep(0.01)
+            await get_summary(**sessions)
+
+        async with self.sessions(server) as sessions:
+            ollama = HttpRequest(session=sessions["ollama"])
+            await asyncio.gather(
+                news_summary.summarize_feed(None, ollama, "hackernews"),
+                request(sessions),
+            )
+        self.assertEqual(server.generated, 1)
+        self.assertEqual(server.rendered(), "news of the day")
+
+    async def test_failed_generation(self) -> None:
+        server = SummaryServer(failures=1)
+        with self.assertRaises(aiohttp.ClientResponseError):
+            await self.summarize(server)
+        job = await Job.objects.aget(name="news_summary")
+        self.assertEqual(job.status, "error")
+        # the key is free again, the next request generates the summary
+        await self.summarize(server)
+        await job.arefresh_from_db()
+        self.assertEqual(job.status, "success")
+        self.assertEqual(server.generated, 2)
+
+    async def test_overloaded(self) -> None:
+        server = SummaryServer()
+        scheduler = Scheduler("llm", max_wait=0.01)
+        with mock.patch.object(news_summary, "_llm_scheduler", scheduler):
+            await scheduler.acquire()
+            await self.summarize(server)
+            job = await Job.objects.aget(name="news_summary")
+            self.assertEqual(job.status, "error")
+            self.assertEqual(server.generated, 0)
+            self.assertIn("busy", server.rendered())
+            # the shed job is claimed again once the queue drains
+            scheduler.release()
+            await self.summarize(server)
+        await job.arefresh_from_db()
+        self.assertEqual(job.status, "success")
+        self.assertEqual(server.rendered(), "news of the day")
+
+    async def cancelled(self, server: SummaryServer, cancel=None) -> Job:
+        async with self.sessions(server) as sessions:
+            task = asyncio.ensure_future(get_summary(**sessions))
+            if cancel is not None:
+                await asyncio.wait_for(server.streaming.wait(), 5)
+                cancel()
+            await asyncio.wait_for(task, 5)
+        job = await Job.objects.aget(name="news_summary")
+        self.assertEqual(job.status, "cancelled")
+        # the stream is closed, nothing holds the model
+        self.assertLess(server.streamed, len(server.tokens))
+        self.assertEqual(news_summary.llm_scheduler().active, 0)
+        self.assertEqual(news_summary.inflight, {})
+        return job
+
+    async def test_cancel(self) -> None:
+        server = SummaryServer(tokens=["news "] * 50, delay=0.01)
+        job = await self.cancelled(
+            server, lambda: self.assertTrue(cancel_summary("hackernews"))
+        )
+        self.assertEqual(job.data["cancelled"], "cancelled")
+        # the partial summary is kept on the job
+        self.assertTrue(job.data["news-summary"].startswith("news "))
+
+    @override_settings(NEWS_SUMMARY_PRESENCE_INTERVAL=0.01)
+    async def test_no_subscribers(self) -> None:
+        server = SummaryServer(tokens=["news "] * 50, delay=0.01, subscribers=0)
+        job = await self.cancelled(server)
+        self.assertEqual(job.data["cancelled"], "no subscribers")
+
+    @override_settings(NEWS_SUMMARY_TIME_BUDGET=0.05)
+    async def test_time_budget(self) -> None:
+        server = SummaryServer(tokens=["news "] * 50, delay=0.01, subscribers=1)
+        job = await self.cancelled(server)
+        self.assertEqual(job.data["cancelled"], "timeout")
+        # the next request claims the job again
+        server = SummaryServer()
+        with override_settings(NEWS_SUMMARY_TIME_BUDGET=60):
+            await self.summarize(server)
+        await job.arefresh_from_db()
+        self.assertEqual(job.status, "success")
+        self.assertNotIn("cancelled", job.data)
+
+
+class FeedServer:
+    """Stand-in for RSS hosts, answering 304 while a feed is unchanged."""
+
+    def __init__(self):
+        self.titles = {"fast": ["a"], "slow": ["b"]}
+        self.requests = []
+        self.app = web.Application()
+        self.app.router.add_get("/{feed}.rss", self.feed)
+
+    async def feed(self, request: web.Request) -> web.Response:
+        titles = self.titles[request.match_info["feed"]]
+        etag = f'"{len(titles)}"'
+        self.requests.append((request.match_info["feed"], request.headers))
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=HTTPStatus.NOT_MODIFIED, headers={"ETag": etag})
+        items = "".join(f"<item><title>{t}</title></item>" for t in titles)
+        return web.Response(
+            text=f"<rss><channel>{items}</channel></rss>",
+            content_type="application/rss+xml",
+            headers={"ETag": etag},
+        )
+
+
+class TestFeedPoller(TestCase):
+    async def test_adaptive_interval(self) -> None:
+        server = FeedServer()
+        metrics = Metrics()
+        async with TestServer(server.app) as http, aiohttp.ClientSession() as session:
+            poller = FeedPoller(
+                HttpRequest(session=session),
+                concurrency=2,
+                min_interval=10,
+                max_interval=100,
+                metrics=metrics,
+            )
+            states = {
+                name: FeedState(
+                    Feed(name, name, str(http.make_url(f"/{name}.rss"))), 40
+                )
+                for name in server.titles
+            }
+            for _ in range(4):
+                server.titles["fast"].append("x")
+                await asyncio.gather(*(poller.poll_once(s) for s in states.values()))
+        fast, slow = states["fast"], states["slow"]
+        # the first poll only learns the titles
+        self.assertEqual((fast.changes, fast.polls), (3, 4))
+        self.assertEqual(fast.interval, 10)
+        self.assertEqual(slow.interval, 100)
+        self.assertAlmostEqual(metrics.gauges["feed_poller.change_rate.fast"], 3 / 4)
+        self.assertEqual(metrics.gauges["feed_poller.change_rate.slow"], 0)
+        self.assertEqual(len(metrics.timings["feed_poller.fetch_latency.slow"]), 4)
+        # unchanged feeds are fetched conditionally and not parsed again
+        self.assertEqual(metrics.counters["feed_poller.not_modified"], 3)
+        self.assertEqual(server.requests[-1][1]["If-None-Match"], '"1"')
+
+    async def test_failure(self) -> None:
+        metrics = Metrics()
+        async with aiohttp.ClientSession() as session:
+            poller = FeedPoller(HttpRequest(session=session), metrics=metrics)
+            feed = Feed("down", "Down", "http://127.0.0.1:9/down.rss")
+            with self.assertLogs(level="WARNING"):
+                states = await poller.run([feed], once=True)
+        self.assertEqual(metrics.counters["feed_poller.errors"], 1)
+        self.assertEqual(states["down"].interval, 90)
+
+
+class TestOllamaBench(TestCase):
+    def test_bench(self) -> None:
+        out = io.StringIO()
+        call_command("ollama_bench", tokens=1000, chunk_size=7, rounds=1, stdout=out)
+        self.assertIn("1000 tokens in", out.getvalue())
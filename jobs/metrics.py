@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import math
+from collections import defaultdict, deque
+from typing import Deque, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: Iterable[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class Metrics:
+    """In-process counters, gauges and timings for the job consumers.
+
+    Timings keep the most recent `window` observations per name, enough for
+    p50/p95 without growing with the lifetime of the process.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.gauges: Dict[str, float] = {}
+        self.timings: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=self.window)
+        )
+
+    def incr(self, name: str, value: float = 1) -> None:
+        self.counters[name] += value
+
+    def gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        self.timings[name].append(value)
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "timings": {
+                name: {
+                    "count": len(values),
+                    "p50": round(percentile(values, 50), 4),
+                    "p95": round(percentile(values, 95), 4),
+                    "max": round(max(values, default=0.0), 4),
+                }
+                for name, values in self.timings.items()
+            },
+        }
+
+    def log(self) -> None:
+        logger.info("metrics %s", self.snapshot())
+
+    async def report(self, interval: float) -> None:
+        """Logs a snapshot every `interval` seconds, and once more when cancelled."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                self.log()
+        finally:
+            self.log()
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.gauges.clear()
+        self.timings.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """Copies key and version out of data, one job per key keeps them.
+
+    Racing consumers may already have stored a key twice, the successful or
+    else the newest job wins and the others stay unkeyed history.
+    """
+    Job = apps.get_model("jobs", "Job")
+    jobs = sorted(
+        Job.objects.all(),
+        key=lambda job: (job.status != "success", -job.created_at.timestamp()),
+    )
+    seen = set()
+    for job in jobs:
+        data = job.data if isinstance(job.data, dict) else {}
+        unique = (job.name, data.get("key") or "", data.get("version") or "")
+        if not unique[1] or unique in seen:
+            continue
+        seen.add(unique)
+        job.key, job.version = unique[1], unique[2]
+        job.claimed_at = job.created_at
+        job.save(update_fields=["key", "version", "claimed_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0002_alter_job_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="key",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="version",
+            field=models.CharField(blank=True, default="", max_length=16),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="job",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("key", ""), _negated=True),
+                fields=("name", "key", "version"),
+                name="jobs_job_unique_key",
+            ),
+        ),
+    ]
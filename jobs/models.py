@@ -1,4 +1,62 @@
-from django.db import models
+import datetime
+from typing import Tuple
+
+from asgiref.sync import sync_to_async
+from django.db import connection, models
+from django.utils import timezone
+
+
+class JobQuerySet(models.QuerySet):
+    def claim(
+        self, name: str, key: str, version: str, data: dict, stale_after: float
+    ) -> Tuple["Job", bool]:
+        """Inserts the (name, key, version) job or returns the one already there.
+
+        Runs as a single INSERT ... ON CONFLICT, so of all the callers racing
+        for a key exactly one gets True back. A job that failed or was cancelled,
+        or was left pending for more than `stale_after` seconds, is claimed again.
+        """
+        now = timezone.now()
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        fields = ["name", "key", "version", "data", "status", "created_at"]
+        columns = ", ".join(qn(f) for f in fields + ["claimed_at"])
+        reclaim = (
+            f"{table}.status IN ('error', 'cancelled') OR "
+            f"({table}.status = 'pending' AND {table}.claimed_at < %s)"
+        )
+        values = dict(
+            name=name,
+            key=key,
+            version=version,
+            data=data,
+            status="pending",
+            created_at=now,
+            claimed_at=now,
+        )
+        params = [
+            self.model._meta.get_field(f).get_db_prep_save(v, connection)
+            for f, v in values.items()
+        ]
+        stale = self.model._meta.get_field("claimed_at").get_db_prep_save(
+            now - datetime.timedelta(seconds=stale_after), connection
+        )
+        sql = (
+            f"INSERT INTO {table} ({columns}) "
+            f"VALUES ({', '.join(['%s'] * len(params))}) "
+            f"ON CONFLICT ({qn('name')}, {qn('key')}, {qn('version')}) "
+            f"WHERE NOT ({qn('key')} = '') "
+            f"DO UPDATE SET "
+            f"status = CASE WHEN {reclaim} THEN 'pending' ELSE {table}.status END, "
+            f"claimed_at = CASE WHEN {reclaim} "
+            f"THEN EXCLUDED.claimed_at ELSE {table}.claimed_at END "
+            f"RETURNING id, {columns}"
+        )
+        (job,) = self.model.objects.raw(sql, params + [stale, stale])
+        return job, job.claimed_at == now
+
+    async def aclaim(self, *args, **kwargs) -> Tuple["Job", bool]:
+        return await sync_to_async(self.claim)(*args, **kwargs)
 
 
 class Job(models.Model):
@@ -6,15 +64,29 @@ class Job(models.Model):
         ("pending", "Pending"),
         ("success", "Success"),
         ("error", "Error"),
+        ("cancelled", "Cancelled"),
     ]
 
     data = models.JSONField()
     name = models.CharField(max_length=255)
+    # jobs that must only run once per input carry a key, see JobQuerySet.claim
+    key = models.CharField(max_length=64, default="", blank=True)
+    version = models.CharField(max_length=16, default="", blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
 
     class Meta:
         ordering = ("-created_at",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "key", "version"],
+                condition=~models.Q(key=""),
+                name="jobs_job_unique_key",
+            ),
+        ]
 
     def __str__(self):
         return self.name
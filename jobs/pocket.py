@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import random
+import time
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Optional
+
+import aiohttp
+
+from jobs.metrics import Metrics, metrics as default_metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+)
+
+
+Reader = Callable[[aiohttp.ClientResponse], Awaitable[Any]]
+
+
+class PocketError(Exception):
+    pass
+
+
+async def read_json(resp: aiohttp.ClientResponse) -> Any:
+    return await resp.json()
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RetryBudget:
+    """Caps the retries a single sync may spend across all of its requests."""
+
+    def __init__(self, retries: int):
+        self.retries = retries
+        self.spent = 0
+
+    def spend(self) -> bool:
+        if self.spent >= self.retries:
+            return False
+        self.spent += 1
+        return True
+
+
+class PocketClient:
+    """Pocket API client sharing one connection pool across every request.
+
+    Requests are rate limited by a token bucket. Timeouts, connection errors,
+    429s and 5xx responses are retried with exponential backoff and full
+    jitter while both `max_retries` and the caller's retry budget allow it;
+    anything else raises PocketError.
+
+    Responses are decoded by `read`, called inside the retry loop while the
+    body is still streaming, so a body cut short is retried like any other
+    connection error.
+    """
+
+    def __init__(
+        self,
+        consumer_key: str,
+        base_url: str = "https://getpocket.com",
+        rate: float = 2.5,
+        burst: int = 10,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        read_timeout: float = 10.0,
+        connection_limit: int = 10,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.consumer_key = consumer_key
+        self.base_url = base_url
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.read_timeout = read_timeout
+        self.connection_limit = connection_limit
+        self.metrics = metrics or default_metrics
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "PocketClient":
+        self.session = aiohttp.ClientSession(
+            trust_env=False,
+            raise_for_status=True,
+            connector=aiohttp.TCPConnector(limit=self.connection_limit),
+            timeout=aiohttp.ClientTimeout(total=self.read_timeout),
+            headers={"Content-Type": "application/json"},
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.session.close()
+
+    async def get(
+        self,
+        budget: RetryBudget,
+        access_token: str,
+        read: Reader = read_json,
+        **params,
+    ) -> Any:
+        return await self.request(
+            budget,
+            aiohttp.hdrs.METH_POST,
+            "/v3/get",
+            read=read,
+            json={"consumer_key": self.consumer_key, "access_token": access_token}
+            | params,
+        )
+
+    async def request(
+        self,
+        budget: RetryBudget,
+        method: str,
+        path: str,
+        read: Reader = read_json,
+        **kwargs,
+    ) -> Any:
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            self.metrics.incr("pocket.requests")
+            started = time.perf_counter()
+            try:
+                async with self.session.request(
+                    method, f"{self.base_url}{path}", **kwargs
+                ) as resp:
+                    data = await read(resp)
+            except aiohttp.ClientResponseError as e:
+                if e.status not in RETRY_STATUSES:
+                    self.metrics.incr("pocket.failures")
+                    raise PocketError(f"pocket responded {e.status}") from e
+                error: Exception = e
+            except (
+                asyncio.TimeoutError,
+                aiohttp.ClientConnectionError,
+                aiohttp.ClientPayloadError,
+            ) as e:
+                error = e
+            except ValueError as e:
+                self.metrics.incr("pocket.failures")
+                raise PocketError(f"unable to decode response: {e}") from e
+            else:
+                self.metrics.observe("pocket.latency", time.perf_counter() - started)
+                return data
+
+            if attempt >= self.max_retries or not budget.spend():
+                self.metrics.incr("pocket.failures")
+                raise PocketError(f"giving up after {attempt + 1} attempts") from error
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+            attempt += 1
+            self.metrics.incr("pocket.retries")
+            logger.warning("retrying pocket request in %0.2fs: %r", delay, error)
+            await asyncio.sleep(delay)
@@ -0,0 +1,102 @@
+import html
+import math
+import re
+import unicodedata
+from typing import Iterable, List, NamedTuple, Optional
+
+WHITESPACE = re.compile(r"\s+")
+TAG = re.compile(r"<[^>]+>")
+
+INSTRUCTIONS = (
+    "You are an editor-in-chief assistant. Summarize the latest news below in "
+    "one paragraph. Do not comment on the subject and do not leave important "
+    "details out."
+)
+
+
+class Prompt(NamedTuple):
+    text: str
+    tokens: int
+    titles: int
+    excerpts: int
+    dropped: int
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly four characters per token for English text, without a tokenizer."""
+    return math.ceil(len(text) / 4)
+
+
+def normalize(text: Optional[str]) -> str:
+    """Plain single line text, without markup, entities or odd unicode forms."""
+    text = html.unescape(TAG.sub(" ", text or ""))
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def truncate(text: str, size: int) -> str:
+    if len(text) <= size:
+        return text
+    cut = text[:size].rsplit(" ", 1)[0]
+    return cut.rstrip(" ,;:.") + "..."
+
+
+def build_prompt(
+    titles: Iterable[Optional[str]],
+    excerpts: Iterable[Optional[str]] = (),
+    budget: int = 512,
+    excerpt_size: int = 200,
+) -> Prompt:
+    """Builds the summary prompt for a feed within about `budget` tokens.
+
+    Titles are normalized and deduplicated, then added in feed order until
+    the budget runs out. Budget left after every title is filled with the
+    excerpts of those titles, each cut to `excerpt_size` characters.
+    `excerpts` pairs up with `titles`, an excerpt_size of 0 leaves them out.
+    """
+    entries = []
+    seen = set()
+    titles = list(titles)
+    excerpts = list(excerpts)
+    excerpts += [None] * (len(titles) - len(excerpts))
+    for title, excerpt in zip(titles, excerpts):
+        title = normalize(title)
+        if not title or title.casefold() in seen:
+            continue
+        seen.add(title.casefold())
+        entries.append((title, normalize(excerpt)))
+
+    lines: List[str] = [INSTRUCTIONS, "", "Titles:"]
+    tokens = estimate_tokens("\n".join(lines))
+    kept = []
+    for title, excerpt in entries:
+        line = f"- {title}"
+        cost = estimate_tokens(line) + 1
+        if tokens + cost > budget:
+            break
+        lines.append(line)
+        tokens += cost
+        kept.append((title, excerpt))
+
+    excerpt_lines: List[str] = []
+    if excerpt_size > 0:
+        used = tokens + estimate_tokens("\nExcerpts:") + 1
+        for title, excerpt in kept:
+            if not excerpt or excerpt.casefold() == title.casefold():
+                continue
+            line = f"- {title}: {truncate(excerpt, excerpt_size)}"
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            excerpt_lines.append(line)
+            used += cost
+    if excerpt_lines:
+        lines += ["", "Excerpts:", *excerpt_lines]
+
+    text = "\n".join(lines)
+    return Prompt(
+        text=text,
+        tokens=estimate_tokens(text),
+        titles=len(kept),
+        excerpts=len(excerpt_lines),
+        dropped=len(entries) - len(kept),
+    )
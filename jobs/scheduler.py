@@ -0,0 +1,105 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+from typing import AsyncIterator, List, Optional
+
+from jobs.metrics import Metrics, metrics as default_metrics
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Scheduler:
+    """Caps concurrent calls to a shared backend and queues the rest.
+
+    Waiters are served by priority, lowest first, then in arrival order, so
+    interactive requests overtake queued background work. An interactive
+    waiter that has not been served within `max_wait` seconds is shed with
+    Overloaded rather than piling onto a backend that is already behind;
+    background work has nobody waiting on it and queues for as long as it
+    takes.
+
+    The cap holds within one process, callers sharing a backend must share
+    the process too.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int = 1,
+        max_wait: Optional[float] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.metrics = metrics or default_metrics
+        self.active = 0
+        self.waiters: List[list] = []
+        self._order = itertools.count()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: int = INTERACTIVE) -> None:
+        queued_at = time.monotonic()
+        if self.active < self.concurrency and not self.waiters:
+            self.active += 1
+            self._observe(queued_at)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, [priority, next(self._order), waiter])
+        self._gauges()
+        try:
+            max_wait = self.max_wait if priority <= INTERACTIVE else None
+            await asyncio.wait_for(asyncio.shield(waiter), max_wait)
+        except asyncio.TimeoutError:
+            # the slot may have been handed over as the wait ran out
+            if not waiter.done():
+                waiter.cancel()
+                self._discard()
+                self.metrics.incr(f"{self.name}.shed")
+                raise Overloaded(
+                    f"{self.name} queue wait exceeded {self.max_wait:0.1f}s"
+                )
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self._discard()
+            raise
+        self._observe(queued_at)
+
+    def release(self) -> None:
+        self._discard()
+        if self.waiters:
+            # the slot passes straight to the next waiter, active is unchanged
+            _, _, waiter = heapq.heappop(self.waiters)
+            waiter.set_result(None)
+        else:
+            self.active -= 1
+        self._gauges()
+
+    def _discard(self) -> None:
+        self.waiters = [w for w in self.waiters if not w[2].cancelled()]
+        heapq.heapify(self.waiters)
+
+    def _observe(self, queued_at: float) -> None:
+        self.metrics.observe(f"{self.name}.queue_wait", time.monotonic() - queued_at)
+        self._gauges()
+
+    def _gauges(self) -> None:
+        self.metrics.gauge(f"{self.name}.active", self.active)
+        self.metrics.gauge(f"{self.name}.queued", len(self.waiters))
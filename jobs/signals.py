@@ -43,15 +43,17 @@ def on_news_item_save(sender, **kwargs):
     item = resp.json().get("item")
     if item:
         try:
-            Article(
-                authors=item.get("authors", {}),
-                created_at=datetime.datetime.now(),
-                excerpt=item.get("excerpt", ""),
-                id=int(item.get("item_id")),
-                listen_duration_estimate=0,
-                resolved_title=item.get("title"),
+            Article.objects.update_or_create(
                 user=instance.user,
-            ).save()
+                item_id=int(item.get("item_id")),
+                defaults={
+                    "authors": item.get("authors", {}),
+                    "created_at": datetime.datetime.now(),
+                    "excerpt": item.get("excerpt", ""),
+                    "listen_duration_estimate": 0,
+                    "resolved_title": item.get("title"),
+                },
+            )
         except ValidationError:
             logging.exception("not able to save article")
             instance.status = "error"
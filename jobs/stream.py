@@ -0,0 +1,131 @@
+import codecs
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator, Tuple
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """Decoded text of a byte stream, read one chunk at a time as needed."""
+
+    def __init__(self, chunks: AsyncIterable[bytes]):
+        self.chunks = chunks.__aiter__()
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    async def fill(self) -> None:
+        if self.eof:
+            raise ValueError("unexpected end of JSON input")
+        try:
+            chunk = await self.chunks.__anext__()
+        except StopAsyncIteration:
+            self.eof = True
+            text = self.decoder.decode(b"", final=True)
+        else:
+            text = self.decoder.decode(chunk)
+        # drop everything already decoded so the buffer never outgrows a value
+        self.text = self.text[self.pos :] + text
+        self.pos = 0
+
+    async def peek(self) -> str:
+        """Skips whitespace and returns the next character without consuming it."""
+        while True:
+            self.pos = WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            await self.fill()
+
+    async def expect(self, chars: str) -> str:
+        char = await self.peek()
+        if char not in chars:
+            raise ValueError(f"expected one of {chars!r}, found {char!r}")
+        self.pos += 1
+        return char
+
+    async def value(self) -> Any:
+        await self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # a number at the end of the buffer may continue in the next chunk
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return value
+            await self.fill()
+
+
+async def _iter_members(buf: _Buffer) -> AsyncIterator[Any]:
+    close = "}" if await buf.expect("{[") == "{" else "]"
+    if await buf.peek() == close:
+        buf.pos += 1
+        return
+    while True:
+        if close == "}":
+            await buf.value()
+            await buf.expect(":")
+        yield await buf.value()
+        if await buf.expect("," + close) == close:
+            return
+
+
+async def iter_object(
+    chunks: AsyncIterable[bytes], expand: str
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Decodes a JSON object from a byte stream one member at a time.
+
+    Members are yielded as (key, value) pairs, except for `expand`. When it
+    holds an object or an array its values are yielded one by one as
+    (expand, value), so only a single value is ever held in memory. Malformed
+    or truncated input raises ValueError.
+    """
+    buf = _Buffer(chunks)
+    await buf.expect("{")
+    if await buf.peek() == "}":
+        return
+    while True:
+        key = await buf.value()
+        if not isinstance(key, str):
+            raise ValueError(f"expected an object key, found {key!r}")
+        await buf.expect(":")
+        if key == expand and await buf.peek() in "{[":
+            async for value in _iter_members(buf):
+                yield key, value
+        else:
+            yield key, await buf.value()
+        if await buf.expect(",}") == "}":
+            return
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Frames newline delimited records from a byte stream.
+
+    Each line is copied once, by slicing it out of its chunk, and only a record
+    split across chunks goes through the carry buffer. This is not zero-copy:
+    the JSON decoder wants bytes, and a memoryview would have to be copied
+    back into bytes for it. Blank lines are skipped and a last line without a
+    trailing newline is still yielded.
+    """
+    pending = bytearray()
+    async for chunk in chunks:
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            if pending:
+                pending += chunk[start:end]
+                line = bytes(pending)
+                pending.clear()
+            else:
+                line = chunk[start:end]
+            start = end + 1
+            if line.strip():
+                yield line
+        pending += chunk[start:]
+    if pending.strip():
+        yield bytes(pending)
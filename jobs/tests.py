@@ -78,3 +78,48 @@ class TestCreateView(TestCase):
         )
         self.assertEqual(self.resp.status_code, 200)
         self.assertTemplateUsed(self.resp, "jobs/job_form.html")
+
+
+class TestClaim(TestCase):
+    def claim(self, stale_after: float = 60.0):
+        return Job.objects.claim(
+            "news_summary", "abc", "1", {"key": "abc"}, stale_after=stale_after
+        )
+
+    def test_claim_once(self) -> None:
+        job, claimed = self.claim()
+        self.assertTrue(claimed)
+        self.assertEqual(job.status, "pending")
+        self.assertEqual(job.data, {"key": "abc"})
+        self.assertEqual(job.created_at, job.claimed_at)
+        again, claimed = self.claim()
+        self.assertFalse(claimed)
+        self.assertEqual(again.id, job.id)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_reclaim_failed(self) -> None:
+        job, _ = self.claim()
+        for status in ("error", "cancelled"):
+            with self.subTest(status=status):
+                Job.objects.filter(id=job.id).update(status=status)
+                again, claimed = self.claim()
+                self.assertTrue(claimed)
+                self.assertEqual((again.id, again.status), (job.id, "pending"))
+                self.assertNotEqual(again.created_at, again.claimed_at)
+
+    def test_success_is_final(self) -> None:
+        job, _ = self.claim()
+        Job.objects.filter(id=job.id).update(status="success")
+        again, claimed = self.claim(stale_after=0)
+        self.assertFalse(claimed)
+        self.assertEqual(again.status, "success")
+
+    def test_reclaim_stale(self) -> None:
+        self.claim()
+        _, claimed = self.claim(stale_after=0)
+        self.assertTrue(claimed)
+
+    def test_unkeyed_jobs(self) -> None:
+        Job.objects.create(name="library_sync", data={})
+        Job.objects.create(name="library_sync", data={})
+        self.assertEqual(Job.objects.filter(name="library_sync").count(), 2)
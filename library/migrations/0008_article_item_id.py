@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """Articles were keyed by their pocket item id until now."""
+    Article = apps.get_model("library", "Article")
+    Article.objects.update(item_id=models.F("id"))
+    if schema_editor.connection.vendor == "postgresql":
+        # ids were always given explicitly, so the sequence never moved
+        table = Article._meta.db_table
+        schema_editor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE(MAX(id), 1)) FROM {table}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0007_article_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="item_id",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="article",
+            name="item_id",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name="article",
+            constraint=models.UniqueConstraint(
+                fields=("user", "item_id"), name="library_article_unique_item"
+            ),
+        ),
+    ]
@@ -21,13 +21,21 @@ class Tag(models.Model):
 class Article(models.Model):
     class Meta:
         ordering = ["created_at"]
+        constraints = [
+            # pocket item ids are shared by every account that saved the item
+            models.UniqueConstraint(
+                fields=["user", "item_id"], name="library_article_unique_item"
+            ),
+        ]
 
     id = models.BigAutoField(primary_key=True)
+    item_id = models.BigIntegerField()
     authors = models.JSONField()
     excerpt = models.TextField(default="")
     slug = models.UUIDField(default=uuid.uuid4, editable=False)
     resolved_title = models.CharField(max_length=256)
     listen_duration_estimate = models.IntegerField()
+    content_hash = models.CharField(max_length=64, default="")
     user = models.ForeignKey(User, related_name="articles", on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -1,3 +1,4 @@
+import itertools
 from typing import List
 from unittest import mock
 
@@ -9,9 +10,13 @@ from social_django.models import UserSocialAuth
 from .models import Article, Tag
 
 
+item_ids = itertools.count(1)
+
+
 def article(**kwargs) -> Article:
     a = Article(
         authors={"1": "author"},
+        item_id=next(item_ids),
         listen_duration_estimate=100,
         **kwargs,
     )
@@ -19,7 +19,9 @@ class IndexView(auth.LoginRequiredMixin, generic.TemplateView):
         resp = super().get(request, *arg, **args)
         if publisher and resp.status_code < HTTPStatus.BAD_REQUEST:
             try:
-                publisher.publish(json.dumps({"action": "library-sync"}))
+                publisher.publish(
+                    json.dumps({"action": "library-sync", "user_id": request.user.id})
+                )
             except pika.exceptions.ConnectionWrongStateError:
                 logging.exception("library sync published failed - skipping")
                 messages.error(request, "Ooops, not able to publish library sync.")
@@ -11,8 +11,9 @@ from scrutiny.env import deploy_env, get_rmq_dsn  # noqa
 
 
 class Publisher(threading.Thread):
-    def __init__(self, queue: str, *args, **kwargs):
+    def __init__(self, queue: str, *args, fanout: Optional[str] = None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fanout = fanout
         self.channel: Optional[BlockingChannel] = None
         self.connection: Optional[BlockingConnection] = None
         self.params = pika.URLParameters(get_rmq_dsn())
@@ -29,15 +30,18 @@ class Publisher(threading.Thread):
             return
         self.channel = self.connection.channel()
         self.channel.queue_declare(queue=self.queue, auto_delete=True)
+        if self.fanout:
+            self.channel.exchange_declare(exchange=self.fanout, exchange_type="fanout")
         self.is_running = True
 
         while self.is_running:
             self.connection.process_data_events(time_limit=1)
 
-    def _publish(self, message):
+    def _publish(self, message, exchange=""):
         if self.channel is not None:
             try:
-                self.channel.basic_publish("", self.queue, body=message.encode())
+                routing_key = "" if exchange else self.queue
+                self.channel.basic_publish(exchange, routing_key, body=message.encode())
             except Exception:
                 logging.exception("not able to publish message")
 
@@ -47,6 +51,13 @@ class Publisher(threading.Thread):
                 functools.partial(self._publish, message)
             )
 
+    def broadcast(self, message):
+        """Publishes to every consumer bound to the fanout exchange."""
+        if self.connection is not None and self.fanout:
+            self.connection.add_callback_threadsafe(
+                functools.partial(self._publish, message, self.fanout)
+            )
+
     def stop(self):
         self.is_running = False
         if self.connection is None:
@@ -67,5 +78,7 @@ class HackernewsConfig(AppConfig):
     def ready(self):
         if deploy_env() != "test":
             global publisher
-            publisher = Publisher(queue="news-summary")  # noqa
+            publisher = Publisher(  # noqa
+                queue="news-summary", fanout="news-summary-cancel"
+            )
             publisher.start()
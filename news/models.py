@@ -1,4 +1,9 @@
-from typing import Any, Callable, Dict, List, Optional
+import logging
+import threading
+import time
+from http import HTTPStatus
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
 
 import feedparser as default_parser
 from django.contrib.auth.models import User
@@ -6,8 +11,11 @@ from django.db import models
 from pydantic import AnyHttpUrl
 from pydantic.dataclasses import dataclass
 
+from scrutiny.env import get_news_feed_cache_max_stale, get_news_feed_cache_ttl
 
-Parser = Callable[[str], Any]
+logger = logging.getLogger(__name__)
+
+Parser = Callable[..., Any]
 
 
 @dataclass(frozen=True)
@@ -85,10 +93,124 @@ class FeedResponse:
     entries: List[dict]
 
 
+class Snapshot(NamedTuple):
+    entries: List[dict]
+    fetched_at: float
+    etag: Optional[str] = None
+    modified: Optional[str] = None
+
+    def validators(self) -> Dict[str, str]:
+        return {
+            name: value
+            for name, value in (("etag", self.etag), ("modified", self.modified))
+            if value
+        }
+
+
+class FeedCache:
+    """Parsed feed entries by feed id, served stale while they are refreshed.
+
+    Entries younger than `ttl` are served as they are. Older ones are still
+    served, up to `max_stale`, while a single background refresh per feed
+    fetches them again. Feeds never fetched, or staler than that, are fetched
+    in the request.
+
+    Fetches are conditional on the validators of the last snapshot, so a feed
+    that did not change answers 304 and its entries are kept as they are.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_stale: Optional[float] = None,
+        workers: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="FeedCache")
+        self._lock = threading.Lock()
+        self._refreshing: Dict[str, Future] = {}
+        self._snapshots: Dict[str, Snapshot] = {}
+
+    def entries(self, feed: Feed, parser: Parser = default_parser.parse) -> List[dict]:
+        ttl = get_news_feed_cache_ttl() if self.ttl is None else self.ttl
+        max_stale = (
+            get_news_feed_cache_max_stale()
+            if self.max_stale is None
+            else self.max_stale
+        )
+        snapshot = self._snapshots.get(feed.id)
+        if snapshot:
+            age = self.clock() - snapshot.fetched_at
+            if age < ttl:
+                return snapshot.entries
+            if age < ttl + max_stale:
+                self.refresh(feed, parser)
+                return snapshot.entries
+        return self._fetch(feed, parser).entries
+
+    def refresh(self, feed: Feed, parser: Parser = default_parser.parse) -> Future:
+        """Fetches the feed in the background, once at a time per feed."""
+        with self._lock:
+            future = self._refreshing.get(feed.id)
+            if future is None:
+                future = self._executor.submit(self._refresh, feed, parser)
+                self._refreshing[feed.id] = future
+            return future
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshots.clear()
+
+    def _fetch(self, feed: Feed, parser: Parser) -> Snapshot:
+        previous = self._snapshots.get(feed.id)
+        validators = previous.validators() if previous else {}
+        resp = parser(feed.url, **validators)
+        if previous and getattr(resp, "status", None) == HTTPStatus.NOT_MODIFIED:
+            snapshot = previous._replace(
+                fetched_at=self.clock(),
+                etag=getattr(resp, "etag", None) or previous.etag,
+                modified=getattr(resp, "modified", None) or previous.modified,
+            )
+        else:
+            snapshot = Snapshot(
+                entries=getattr(resp, "entries"),
+                fetched_at=self.clock(),
+                etag=getattr(resp, "etag", None),
+                modified=getattr(resp, "modified", None),
+            )
+        self._snapshots[feed.id] = snapshot
+        return snapshot
+
+    def _refresh(self, feed: Feed, parser: Parser) -> Optional[Snapshot]:
+        try:
+            return self._fetch(feed, parser)
+        except Exception:
+            # the stale entries are kept until a refresh succeeds
+            logger.warning("feed %s refresh failed", feed.id, exc_info=True)
+            return None
+        finally:
+            with self._lock:
+                self._refreshing.pop(feed.id, None)
+
+
+feed_cache = FeedCache()
+
+
 def parse_feed(
-    context: dict, feed: Feed, parser: Parser = default_parser.parse, limit: int = 10
+    context: dict,
+    feed: Feed,
+    parser: Parser = default_parser.parse,
+    limit: int = 10,
+    cache: Optional[FeedCache] = None,
 ) -> dict:
-    resp = FeedResponse(entries=getattr(parser(feed.url), "entries"))
+    if cache is None:
+        entries = getattr(parser(feed.url), "entries")
+    else:
+        entries = cache.entries(feed, parser)
+    resp = FeedResponse(entries=entries)
     context |= {
         "id": feed.id,
         "title": feed.title,
@@ -1,10 +1,12 @@
+import json
+import threading
 from unittest import mock
 
 from django.contrib.auth.models import User
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from .models import FeedRegistry, FeedResponse
+from .models import FeedCache, FeedRegistry, FeedResponse, feed_cache
 
 
 class TestListView(TestCase):
@@ -39,6 +41,7 @@ class TestFeedView(TestCase):
         self.url = f"{reverse('news.feed_view')}?feed=hackernews"
         self.user = User.objects.create_superuser("foo", "myemail@test.com", "pass")
         self.client.login(username="foo", password="pass")
+        feed_cache.clear()
 
     def test_feeds_anonymous_user(self) -> None:
         self.client.logout()
@@ -70,6 +73,80 @@ class TestFeedView(TestCase):
             self.assertContains(self.resp, "hello")
 
 
+class TestFeedCache(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.now = 0.0
+        self.feed = FeedRegistry.get("hackernews")
+        self.cache = FeedCache(ttl=60, max_stale=600, clock=lambda: self.now)
+        self.parse = mock.Mock(side_effect=self.response)
+
+    def response(self, url):
+        return FeedResponse(entries=[{"title": f"at {self.now}"}])
+
+    def test_fresh(self) -> None:
+        self.assertEqual(
+            self.cache.entries(self.feed, self.parse), [{"title": "at 0.0"}]
+        )
+        self.now = 59
+        self.assertEqual(
+            self.cache.entries(self.feed, self.parse), [{"title": "at 0.0"}]
+        )
+        self.parse.assert_called_once_with(self.feed.url)
+
+    def test_stale_while_revalidate(self) -> None:
+        self.cache.entries(self.feed, self.parse)
+        release = threading.Event()
+        self.parse.side_effect = lambda url: release.wait(5) and self.response(url)
+        self.now = 61
+        for _ in range(3):
+            self.assertEqual(
+                self.cache.entries(self.feed, self.parse), [{"title": "at 0.0"}]
+            )
+        refresh = self.cache.refresh(self.feed, self.parse)
+        release.set()
+        refresh.result(5)
+        self.assertEqual(self.parse.call_count, 2)
+        self.assertEqual(
+            self.cache.entries(self.feed, self.parse), [{"title": "at 61"}]
+        )
+
+    def test_too_stale(self) -> None:
+        self.cache.entries(self.feed, self.parse)
+        self.now = 60 + 600
+        self.assertEqual(
+            self.cache.entries(self.feed, self.parse), [{"title": "at 660"}]
+        )
+
+    def test_not_modified(self) -> None:
+        self.parse.side_effect = None
+        self.parse.return_value = mock.Mock(
+            entries=[{"title": "hello"}], status=200, etag='"v1"', modified=None
+        )
+        self.cache.entries(self.feed, self.parse)
+        self.parse.return_value = mock.Mock(
+            entries=[], status=304, etag=None, modified=None
+        )
+        self.now = 60 + 600
+        self.assertEqual(
+            self.cache.entries(self.feed, self.parse), [{"title": "hello"}]
+        )
+        self.parse.assert_called_with(self.feed.url, etag='"v1"')
+        self.now = 2 * (60 + 600)
+        self.cache.entries(self.feed, self.parse)
+        self.parse.assert_called_with(self.feed.url, etag='"v1"')
+
+    def test_failed_refresh(self) -> None:
+        self.cache.entries(self.feed, self.parse)
+        self.parse.side_effect = OSError("unreachable")
+        self.now = 61
+        with self.assertLogs("news.models", "WARNING"):
+            self.assertIsNone(self.cache.refresh(self.feed, self.parse).result(5))
+        self.assertEqual(
+            self.cache.entries(self.feed, self.parse), [{"title": "at 0.0"}]
+        )
+
+
 class TestNewsItemFormView(TestCase):
     client_class = Client
 
@@ -133,3 +210,22 @@ class TestNewsSummaryView(TestCase):
         self.assertEqual(self.resp.status_code, 200)
         self.assertTemplateUsed(self.resp, "news/news_summary.html")
         self.assertEqual(self.resp.context["summary"], "Loading...")
+
+    @mock.patch("news.views.publisher")
+    def test_get_feed(self, mock_publisher) -> None:
+        self.resp = self.client.get(self.url, data={"feed_id": "lobsters"})
+        self.assertContains(self.resp, 'target="news-summary-lobsters"')
+        msg = json.loads(mock_publisher.publish.call_args.args[0])
+        self.assertEqual(msg["feed_id"], "lobsters")
+
+    def test_get_unknown_feed(self) -> None:
+        self.resp = self.client.get(self.url, data={"feed_id": "unknown"})
+        self.assertEqual(self.resp.status_code, 404)
+
+    @mock.patch("news.views.publisher")
+    def test_cancel(self, mock_publisher) -> None:
+        url = reverse("news.summary_cancel_view")
+        self.resp = self.client.post(url, data={"feed_id": "lobsters"})
+        self.assertEqual(self.resp.status_code, 204)
+        msg = json.loads(mock_publisher.broadcast.call_args.args[0])
+        self.assertEqual((msg["action"], msg["feed_id"]), ("cancel", "lobsters"))
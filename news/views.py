@@ -5,13 +5,13 @@ from http import HTTPStatus
 import pika
 from django.contrib import messages
 from django.contrib.auth import mixins as auth
-from django.http import Http404
+from django.http import Http404, HttpResponse
 from django.views import generic
 from django.views.generic.edit import CreateView
 
 from .apps import publisher
 from .forms import NewsItemForm
-from .models import FeedRegistry, default_parser, parse_feed
+from .models import FeedRegistry, default_parser, feed_cache, parse_feed
 
 
 class IndexView(auth.LoginRequiredMixin, generic.TemplateView):
@@ -27,7 +27,11 @@ class IndexView(auth.LoginRequiredMixin, generic.TemplateView):
         context["feeds"] = {f.id: f.title for f in FeedRegistry.feeds()}
         context["selected_feed"] = feed_id
         context["feed"] = parse_feed(
-            context, feed, parser=default_parser.parse, limit=self.page_limit
+            context,
+            feed,
+            parser=default_parser.parse,
+            limit=self.page_limit,
+            cache=feed_cache,
         )
         return context
 
@@ -45,7 +49,11 @@ class NewsListView(auth.LoginRequiredMixin, generic.TemplateView):
         context["feeds"] = {f.id: f.title for f in FeedRegistry.feeds()}
         context["selected_feed"] = feed_id
         return parse_feed(
-            context, feed, parser=default_parser.parse, limit=self.page_limit
+            context,
+            feed,
+            parser=default_parser.parse,
+            limit=self.page_limit,
+            cache=feed_cache,
         )
 
 
@@ -62,7 +70,7 @@ class NewsItemFormView(auth.LoginRequiredMixin, CreateView):
         context["feeds"] = {f.id: f.title for f in FeedRegistry.feeds()}
         context["selected_feed"] = feed.id
         context["selected"] = form.selected_title()
-        return parse_feed(context, feed)
+        return parse_feed(context, feed, cache=feed_cache)
 
     def form_valid(self, form: NewsItemForm):
         item = form.save(commit=False)
@@ -77,6 +85,10 @@ class NewsSummaryFormView(auth.LoginRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        feed = FeedRegistry.get(self.request.GET.get("feed_id", "hackernews"))
+        if not feed:
+            raise Http404("feed does not exist")
+        context["feed_id"] = feed.id
         context["summary"] = "Loading..."
         return context
 
@@ -85,9 +97,38 @@ class NewsSummaryFormView(auth.LoginRequiredMixin, CreateView):
         if publisher and resp.status_code < HTTPStatus.BAD_REQUEST:
             try:
                 publisher.publish(
-                    json.dumps({"topic": "news-summary", "action": "start"})
+                    json.dumps(
+                        {
+                            "topic": "news-summary",
+                            "action": "start",
+                            "feed_id": resp.context_data["feed_id"],
+                        }
+                    )
                 )
             except pika.exceptions.ConnectionWrongStateError:
                 logging.exception("news summary published failed - skipping")
                 messages.error(request, "Ooops, not able to publish news summary.")
         return resp
+
+
+class NewsSummaryCancelView(auth.LoginRequiredMixin, generic.View):
+    """Sent as a beacon when a page with a summary in progress is left."""
+
+    def post(self, request, *args, **kwargs):
+        feed = FeedRegistry.get(request.POST.get("feed_id", "hackernews"))
+        if not feed:
+            raise Http404("feed does not exist")
+        if publisher:
+            try:
+                publisher.broadcast(
+                    json.dumps(
+                        {
+                            "topic": "news-summary",
+                            "action": "cancel",
+                            "feed_id": feed.id,
+                        }
+                    )
+                )
+            except pika.exceptions.ConnectionWrongStateError:
+                logging.exception("news summary cancel failed - skipping")
+        return HttpResponse(status=HTTPStatus.NO_CONTENT)
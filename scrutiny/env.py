@@ -51,3 +51,143 @@ def should_trace() -> bool:
 
 def sse() -> bool:
     return getattr(settings, "SSE", False)
+
+
+def get_pocket_page_size() -> int:
+    return getattr(settings, "POCKET_PAGE_SIZE", 30)
+
+
+def get_pocket_concurrency() -> int:
+    return getattr(settings, "POCKET_CONCURRENCY", 4)
+
+
+def get_pocket_full_sync_interval() -> float:
+    return getattr(settings, "POCKET_FULL_SYNC_INTERVAL", 24 * 60 * 60.0)
+
+
+def get_bulk_batch_size() -> int:
+    return getattr(settings, "BULK_WRITER_BATCH_SIZE", 100)
+
+
+def get_bulk_max_pending() -> int:
+    return getattr(settings, "BULK_WRITER_MAX_PENDING", 4)
+
+
+def get_library_sync_pool_size() -> int:
+    return getattr(settings, "LIBRARY_SYNC_POOL_SIZE", 4)
+
+
+def get_pocket_rate_limit() -> float:
+    return getattr(settings, "POCKET_RATE_LIMIT", 2.5)
+
+
+def get_pocket_rate_burst() -> int:
+    return getattr(settings, "POCKET_RATE_BURST", 10)
+
+
+def get_pocket_max_retries() -> int:
+    return getattr(settings, "POCKET_MAX_RETRIES", 3)
+
+
+def get_pocket_retry_budget() -> int:
+    return getattr(settings, "POCKET_RETRY_BUDGET", 10)
+
+
+def get_pocket_connection_limit() -> int:
+    return getattr(settings, "POCKET_CONNECTION_LIMIT", 10)
+
+
+def get_library_sync_min_interval() -> float:
+    return getattr(settings, "LIBRARY_SYNC_MIN_INTERVAL", 5 * 60.0)
+
+
+def get_news_summary_flush_interval() -> float:
+    return getattr(settings, "NEWS_SUMMARY_FLUSH_INTERVAL", 0.25)
+
+
+def get_news_summary_flush_size() -> int:
+    return getattr(settings, "NEWS_SUMMARY_FLUSH_SIZE", 256)
+
+
+def get_news_summary_publish_mode() -> str:
+    return getattr(settings, "NEWS_SUMMARY_PUBLISH_MODE", "append")
+
+
+def get_news_summary_queue_size() -> int:
+    return getattr(settings, "NEWS_SUMMARY_QUEUE_SIZE", 8)
+
+
+def get_mercure_connection_limit() -> int:
+    return getattr(settings, "MERCURE_CONNECTION_LIMIT", 10)
+
+
+def get_ollama_connection_limit() -> int:
+    return getattr(settings, "OLLAMA_CONNECTION_LIMIT", 4)
+
+
+def get_news_summary_concurrency() -> int:
+    return getattr(settings, "NEWS_SUMMARY_CONCURRENCY", 8)
+
+
+def get_job_claim_timeout() -> float:
+    return getattr(settings, "JOB_CLAIM_TIMEOUT", 10 * 60.0)
+
+
+def get_news_summary_batch_concurrency() -> int:
+    return getattr(settings, "NEWS_SUMMARY_BATCH_CONCURRENCY", 2)
+
+
+def get_news_summary_warm_interval() -> float:
+    return getattr(settings, "NEWS_SUMMARY_WARM_INTERVAL", 5 * 60.0)
+
+
+def get_llm_concurrency() -> int:
+    return getattr(settings, "LLM_CONCURRENCY", 1)
+
+
+def get_llm_max_queue_wait() -> float:
+    return getattr(settings, "LLM_MAX_QUEUE_WAIT", 2 * 60.0)
+
+
+def get_news_summary_time_budget() -> float:
+    return getattr(settings, "NEWS_SUMMARY_TIME_BUDGET", 2 * 60.0)
+
+
+def get_news_summary_presence_interval() -> float:
+    return getattr(settings, "NEWS_SUMMARY_PRESENCE_INTERVAL", 5.0)
+
+
+def get_metrics_log_interval() -> float:
+    return getattr(settings, "METRICS_LOG_INTERVAL", 60.0)
+
+
+def get_news_summary_poll_interval() -> float:
+    return getattr(settings, "NEWS_SUMMARY_POLL_INTERVAL", 1.0)
+
+
+def get_news_summary_prompt_tokens() -> int:
+    return getattr(settings, "NEWS_SUMMARY_PROMPT_TOKENS", 512)
+
+
+def get_news_summary_excerpt_size() -> int:
+    return getattr(settings, "NEWS_SUMMARY_EXCERPT_SIZE", 200)
+
+
+def get_news_feed_cache_ttl() -> float:
+    return getattr(settings, "NEWS_FEED_CACHE_TTL", 60.0)
+
+
+def get_news_feed_cache_max_stale() -> float:
+    return getattr(settings, "NEWS_FEED_CACHE_MAX_STALE", 60 * 60.0)
+
+
+def get_feed_poller_concurrency() -> int:
+    return getattr(settings, "FEED_POLLER_CONCURRENCY", 8)
+
+
+def get_feed_poller_min_interval() -> float:
+    return getattr(settings, "FEED_POLLER_MIN_INTERVAL", 60.0)
+
+
+def get_feed_poller_max_interval() -> float:
+    return getattr(settings, "FEED_POLLER_MAX_INTERVAL", 60 * 60.0)
@@ -6,6 +6,7 @@ from news.views import (
     IndexView as NewsView,
     NewsListView,
     NewsItemFormView,
+    NewsSummaryCancelView,
     NewsSummaryFormView,
 )
 from jobs.views import JobListView, JobDetailView, JobCreateView, JobUpdateView
@@ -22,6 +23,11 @@ urlpatterns = [
     path("news/feeds/", NewsListView.as_view(), name="news.feed_view"),
     path("news/save/", NewsItemFormView.as_view(), name="news.save_view"),
     path("news/summary/", NewsSummaryFormView.as_view(), name="news.summary_view"),
+    path(
+        "news/summary/cancel/",
+        NewsSummaryCancelView.as_view(),
+        name="news.summary_cancel_view",
+    ),
     path("library/", LibraryView.as_view(), name="library"),
     path("library/list/", ArticleListView.as_view(), name="library.list_view"),
     path("library/tags/", TagListView.as_view(), name="library.tag_view"),
@@ -2,3 +2,16 @@ document.addEventListener("DOMContentLoaded", function (e) {
     const es = new EventSource("{{ topic }}");
     Turbo.connectStreamSource(es);
 });
+
+// tells the summary consumers nobody is waiting on the summaries left behind
+window.addEventListener("pagehide", function (e) {
+    const token = document.querySelector("[name=csrfmiddlewaretoken]");
+    document.querySelectorAll("p[id^='news-summary-'][id$='-text']").forEach(function (p) {
+        const data = new FormData();
+        data.append("feed_id", p.id.slice("news-summary-".length, -"-text".length));
+        if (token) {
+            data.append("csrfmiddlewaretoken", token.value);
+        }
+        navigator.sendBeacon("{% url 'news.summary_cancel_view' %}", data);
+    });
+});